@@ -20,33 +20,81 @@ COLLABORATORS
 
 # python libraries
 import numpy as np
-import time, os, sys
-from itertools import permutations, combinations
+import json
 
 # auxiliary modules
 from topology import *
 from post_process import *
+from routing import shared_route_cache, shared_route_table, heuristic_router, store_neighbourhood
+from demand import exponential_demand, historical_demand, sales_files
+from recorder import metrics_recorder
+from scheduler import event_queue, project_stock
+from profiler import handler_profiler
 
-# deactivate interactive mode
-plt.ioff()
-
-#============
-# DATA MODEL
-
-# generate demand drawn from modelled exponential probability distribution for each store
-def generate_demand(store):
-    np.random.seed(0)
-    demand = .5*np.ceil(np.random.exponential(1./(store.exp_sale), None))
-    return(demand)
-
+#================
+# STOCK WARNINGS
+
+# stores with low or zero stock, kept as exclusive boolean masks over the stores
+class stock_warnings:
+    # iteration policy: 'index' (store order) or 'zero_first' (zero stock stores first)
+    def __init__(self, n_stores, policy='index'):
+        self.low = np.zeros(n_stores, dtype=bool)
+        self.zero = np.zeros(n_stores, dtype=bool)
+        # stores on the route of a truck on its way (not offered to other trucks)
+        self.pending = np.zeros(n_stores, dtype=bool)
+        self.policy = policy
+
+    # flag stores (index or array of indices) as low or zero stock
+    def flag_low(self, index):
+        self.low[index] = True
+        self.zero[index] = False
+    def flag_zero(self, index):
+        self.zero[index] = True
+        self.low[index] = False
+
+    # remove warning of stores
+    def clear(self, index):
+        self.low[index] = False
+        self.zero[index] = False
+
+    def __contains__(self, index):
+        return bool(self.low[index] or self.zero[index])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.low | self.zero))
+
+    # update masks with the stores below minimum stock (warnings are kept
+    # until delivery, stores that run out of stock move to zero stock)
+    def update(self, low_stock, zero_stock):
+        self.zero |= zero_stock
+        self.low |= low_stock
+        self.low &= ~self.zero
+
+    # indices of stores with warnings (not on the route of a truck), ordered
+    # by the iteration policy
+    def candidates(self):
+        if self.policy == 'zero_first':
+            return np.concatenate((np.flatnonzero(self.zero & ~self.pending),
+                                   np.flatnonzero(self.low & ~self.pending)))
+        return np.flatnonzero((self.low | self.zero) & ~self.pending)
 
 #==============
 # MAIN PROGRAM
 
+# format of the snapshots of simulation.checkpoint
+checkpoint_version = 2
+
+# kind of demand with its products (e.g. 'replay (sales_p1)')
+def demand_label(kind, products):
+    return kind + (' (%s)' % ', '.join(products) if products else '')
+
 class simulation:
-    # topology variables
-    global P, W, S, G
-    def __init__(self,case):
+    def __init__(self,case,net=None):
+        #=== TOPOLOGY
+        # independent copy of the network (default: store_info.csv network)
+        if net is None:
+            net = load_default_network()
+        self.net = net.fresh()
         #=== TAG
         self.tag = case.tag
         if case.tag == 'n_trucks':
@@ -60,22 +108,40 @@ class simulation:
         else:
             self.var = ''
         #=== UPDATE MIN STOCK
-        for entity in S+W:
-            entity.min_stock = int(case.min_percent * entity.capacity)
+        for state in (self.net.store_state, self.net.warehouse_state):
+            state.min_stock[:] = np.floor(case.min_percent * state.capacity)
         #=== TRUCK DELIVERY SYSTEM
         self.max_stores = case.max_stores
+        self.route_solver = case.route_solver
+        self.routing = case.routing
+        if self.routing not in ('lazy', 'table', 'heuristic'):
+            raise ValueError('unknown routing: '+str(case.routing))
+        self.route_construction = case.route_construction
+        self.route_time_budget = case.route_time_budget
+        # combinations of stores restricted to stores close to each other and
+        # to a warehouse (None: all combinations)
+        self.neighbourhood = None
+        if case.route_radius is not None or case.route_neighbours is not None:
+            self.neighbourhood = store_neighbourhood([(node.x, node.y) for node in self.net.nodes],
+                                                     [w.idx for w in self.net.W], [s.idx for s in self.net.S],
+                                                     case.route_radius, case.route_neighbours)
         self.T = []
         for t in range(case.n_trucks):
             self.T.append(truck('T'+str(t+1),50, 0, (), 1, case.base_cost, case.cost_per_mile, case.max_stores))
+        self.fleet = dict((truck.id, truck) for truck in self.T)
+        #=== DEMAND
+        # daily demand of all stores, drawn from the random stream of the case
+        # or replayed from historical sales
+        if case.demand == 'replay':
+            self.demand = historical_demand(case.demand_files or sales_files, len(self.net.S))
+        elif case.demand == 'exponential':
+            self.demand = exponential_demand(self.net.store_state.exp_sale, case.seed)
+        else:
+            raise ValueError('unknown demand model: '+str(case.demand))
         # === FINANCES
-        # daily
+        # daily (history of finances, logistics and stock, see recorder.py)
         self.price_per_unit = 100
-        self.daily_demand=[]  	    # daily demand over 20 stores
-        self.daily_sales=[]  	        # daily demand over 20 stores
-        self.daily_revenue=[]		    # revenue from sales made over all stores
-        self.daily_opp_cost=[]		 # opportunity loss arising from low stock
-        self.daily_delivery_cost=[]	 # total delivery costs to stores and WHs
-        self.daily_profit=[]         # daily profile calc as revenue - delivery cost
+        self.recorder = metrics_recorder([w.id for w in self.net.W], [s.id for s in self.net.S])
         # cumulative
         self.cum_demand=0
         self.cum_sales=0
@@ -85,99 +151,354 @@ class simulation:
         self.cum_delivery_cost=0
         # stats
         self.delivery_cost_per_prod = 0 # update
+        # skip figures at the end of advance_time (results only)
+        self.headless = case.headless
+        # timing of the handlers (see enable_profiling)
+        self.profiler = None
+        self.profile_path = None
         # === LOGISTICS
-        self.opt_routes = self.optimal_routes()
+        self.opt_routes = None   # routes are computed on first dispatch
         self.interval= case.interval				# interval between deliveries
-        self.daily_stock_W1 = []
-        self.daily_stock_W2 = []
-        self.low_stock_warning = []
-        self.zero_stock_warning = []
-        self.daily_deliveries = []
-        self.daily_warehouse_deliveries = []
-        self.daily_store_deliveries = []
-        self.daily_mileage = []
+        if case.warning_policy not in ('index', 'zero_first'):
+            raise ValueError('unknown warning_policy: '+str(case.warning_policy))
+        self.warnings = stock_warnings(len(self.net.S), case.warning_policy)
+        # warehouses waiting for a restock from their plant
+        self.restocking = np.zeros(len(self.net.W), dtype=bool)
+        #=== SCHEDULER
+        self.scheduler = case.scheduler
+        if self.scheduler not in ('daily', 'events'):
+            raise ValueError('unknown scheduler: '+str(case.scheduler))
+        # truck speed (miles per hour), None: trips end on the day of dispatch
+        self.truck_speed = case.truck_speed
+        if self.truck_speed is not None and self.scheduler != 'events':
+            raise ValueError('truck trips require the event scheduler')
+        # truck arrivals, restocks and returns
+        self.events = event_queue()
+
+    #=== DAILY HISTORY (views of the recorded days)
+    daily_demand = property(lambda self: self.recorder.series('demand'))                # daily demand over all stores
+    daily_sales = property(lambda self: self.recorder.series('sales'))                  # daily sales over all stores
+    daily_revenue = property(lambda self: self.recorder.series('revenue'))              # revenue from sales made over all stores
+    daily_opp_cost = property(lambda self: self.recorder.series('opp_cost'))            # opportunity loss arising from low stock
+    daily_delivery_cost = property(lambda self: self.recorder.series('delivery_cost'))  # total delivery costs to stores and WHs
+    daily_profit = property(lambda self: self.recorder.series('profit'))                # daily profit calc as revenue - delivery cost
+    daily_deliveries = property(lambda self: self.recorder.series('deliveries'))
+    daily_warehouse_deliveries = property(lambda self: self.recorder.series('warehouse_deliveries'))
+    daily_store_deliveries = property(lambda self: self.recorder.series('store_deliveries'))
+    daily_mileage = property(lambda self: self.recorder.series('mileage'))
+    daily_warehouse_stock = property(lambda self: self.recorder.warehouse_block())      # stock of each warehouse
+    daily_store_sales = property(lambda self: self.recorder.store_sales_block())        # effective sales of each store
+    daily_store_missed_sales = property(lambda self: self.recorder.store_missed_sales_block())  # missed sales of each store
 
     # run simulation for 1 year, 6 days a week
-    def advance_time(self, n_days):
-        for day in range(n_days): # all days in a year except sundays
-        #=== SUPPLY CHAIN
-            # run logistics, restocking and delivery
-            daily_logistics = self.supply_chain()
-            # update global history
-            self.daily_deliveries.append(daily_logistics[0])
-            self.daily_warehouse_deliveries.append(daily_logistics[1])
-            self.daily_store_deliveries.append(daily_logistics[2])
-            self.daily_mileage.append(daily_logistics[3])
-            self.daily_delivery_cost.append(daily_logistics[4])
-            self.daily_stock_W1.append(W[0].curr_stock)
-            self.daily_stock_W2.append(W[1].curr_stock)    
-        
-        #=== STORES
-            # run store sales and collect data
-            daily_balance=self.store_iterator()
-            # update global history
-            self.daily_demand.append(daily_balance[0])
-            self.daily_sales.append(daily_balance[1])
-            self.daily_revenue.append(daily_balance[2])
-            self.daily_opp_cost.append(daily_balance[3])
-
-
-        #==========================================
-        # SUMMARY OF FINANCES
+    # (optionally saving a checkpoint every checkpoint_every days of the run,
+    # checkpoint_path may contain {day}, default: <prefix>_checkpoint.npz)
+    def advance_time(self, n_days, checkpoint_every=None, checkpoint_path=None):
+        self.check_demand(n_days)
+        # preallocate history of all days
+        self.recorder.reserve(n_days)
+        while n_days > 0:
+            # days until next checkpoint
+            block = n_days
+            if checkpoint_every:
+                block = min(block, checkpoint_every - self.recorder.days % checkpoint_every)
+            self.run_days(block)
+            n_days -= block
+            if checkpoint_every and self.recorder.days % checkpoint_every == 0:
+                if checkpoint_path is None:
+                    self.save_checkpoint()
+                else:
+                    self.save_checkpoint(checkpoint_path.format(day=self.recorder.days))
+
+        self.summary()
+
+        # plot results and save output
+        if not self.headless:
+            self.render()
+
+        # report of the profiled handlers
+        if self.profiler is not None and self.profiler.active:
+            self.profile_report()
+
+    # run days without summary (demand is drawn for the whole block or in
+    # chunks of days of the demand model, the random stream is the same
+    # however the days are split in blocks)
+    def run_days(self, n_days):
+        self.check_demand(n_days)
+        # preallocate history of all days
+        self.recorder.reserve(n_days)
+        chunk_days = self.demand.chunk_days or n_days
+        for start in range(0, n_days, chunk_days):
+            # demand of all stores for the days of the chunk
+            demand = self.demand.draw(min(chunk_days, n_days - start))
+            if self.scheduler == 'events':
+                self.run_events(demand)
+            else:
+                for day in range(len(demand)): # all days in a year except sundays
+                    self.step(demand[day])
+
+    # the demand model covers n_days more days (a replayed history ends),
+    # checked before any day is run
+    def check_demand(self, n_days):
+        days_left = self.demand.days_left
+        if days_left is not None and n_days > days_left:
+            raise ValueError('demand history has %d days left, %d days requested' % (days_left, n_days))
+
+    # run a single day
+    def step(self, store_demand):
+        row = self.recorder.next_day()
+    #=== SUPPLY CHAIN
+        # run logistics, restocking and delivery
+        daily_logistics = self.supply_chain()
+        # trucks arriving during the day
+        self.process_events(row + 1)
+        # update global history
+        self.recorder.record(row, deliveries=daily_logistics[0],
+                             warehouse_deliveries=daily_logistics[1],
+                             store_deliveries=daily_logistics[2],
+                             mileage=daily_logistics[3],
+                             delivery_cost=daily_logistics[4])
+        self.recorder.warehouse_stock[row] = self.net.warehouse_state.curr_stock
+
+    #=== STORES
+        # run store sales and collect data
+        daily_balance=self.store_iterator(store_demand)
+        # update global history
+        self.recorder.record(row, demand=daily_balance[0], sales=daily_balance[1],
+                             revenue=daily_balance[2], opp_cost=daily_balance[3],
+                             profit=daily_balance[2] - daily_logistics[4])
+
+    #=== EVENT DRIVEN RUN
+    # days on which a truck can be dispatched or a truck event is due are run
+    # with step, the days in between are fast-forwarded (sales only)
+    def run_events(self, demand):
+        day = 0
+        while day < len(demand):
+            n_idle = self.idle_days(len(demand) - day)
+            if n_idle == 0:
+                self.step(demand[day])
+                day += 1
+            else:
+                day += self.fast_forward(demand[day:day+n_idle])
+
+    # number of days from today (up to max_days) without truck events on
+    # which no truck would be dispatched (see restock_warehouses/restock_stores)
+    def idle_days(self, max_days):
+        today = self.recorder.days
+        next_event = self.events.next_time()
+        if next_event < today + max_days:
+            max_days = int(next_event) - today
+        hold = [truck.on_hold for truck in self.T if not truck.route]
+        if not hold:
+            return max(0, max_days)
+        if len(self.warnings.candidates()) > 0:
+            # a truck leaves for the stores once it is one day from the interval
+            return max(0, min(max_days, self.interval - 1 - max(hold)))
+        if np.any(self.warehouses_low()):
+            # trucks gain two days on hold per day until they can leave
+            return max(0, min(max_days, -((max(hold) - self.interval)//2)))
+        return max(0, max_days)
+
+    # warehouses below minimum stock without a restock on its way
+    def warehouses_low(self):
+        state = self.net.warehouse_state
+        return (state.curr_stock <= state.min_stock) & ~self.restocking
+
+    # run idle days at once (demand of each day, days x stores); if no store
+    # is waiting for restock, stops after the first day with a new warning.
+    # returns the number of days run
+    def fast_forward(self, demand):
+        state = self.net.store_state
+        waiting = len(self.warnings.candidates()) > 0
+        stock = project_stock(state.curr_stock, demand)
+        if not waiting:
+            warned = self.warnings.low | self.warnings.zero
+            crossed = np.flatnonzero(np.any((stock <= state.min_stock) & ~warned, axis=1))
+            if len(crossed) > 0:
+                demand, stock = demand[:crossed[0]+1], stock[:crossed[0]+1]
+        n_days = len(demand)
+        # sales of each day
+        eff_sales = np.minimum(demand, np.vstack((state.curr_stock, stock[:-1])))
+        miss_sales = demand - eff_sales
+        # trucks on hold
+        self.hold_trucks(n_days, waiting)
+        # update stock and warnings
+        state.curr_stock[:] = stock[-1]
+        self.inventory_check(state)
+        # update global history
+        rows = self.recorder.next_days(n_days)
+        self.recorder.store_sales[rows] = eff_sales
+        self.recorder.store_missed_sales[rows] = miss_sales
+        self.recorder.warehouse_stock[rows] = self.net.warehouse_state.curr_stock
+        day_revenue = np.sum(eff_sales, axis=1) * self.price_per_unit
+        self.recorder.record(rows, demand=np.sum(demand, axis=1), sales=np.sum(eff_sales, axis=1),
+                             revenue=day_revenue, opp_cost=np.sum(miss_sales, axis=1) * self.price_per_unit,
+                             deliveries=0, warehouse_deliveries=0, store_deliveries=0,
+                             mileage=0, delivery_cost=0, profit=day_revenue)
+        return(n_days)
+
+    # days on hold of the trucks after n_days idle days (same counts as
+    # restock_warehouses and restock_stores without dispatch)
+    def hold_trucks(self, n_days, waiting):
+        for truck in self.T:
+            if truck.route:
+                continue
+            if waiting:
+                truck.on_hold += n_days
+            else:
+                # two days per day until the truck can leave, one day after
+                catch_up = min(n_days, max(0, -((truck.on_hold - self.interval)//2)))
+                truck.on_hold += 2*catch_up + (n_days - catch_up)
+
+    # truck events before time until
+    def process_events(self, until):
+        for event_time, kind, data in self.events.pop_until(until):
+            truck = self.fleet[data[0]]
+            if kind == 'arrival':
+                store = self.net.by_id[data[1]]
+                self.unload(truck, store)
+                self.warnings.pending[store.pos] = False
+            elif kind == 'restock':
+                warehouse = self.net.by_id[data[1]]
+                warehouse.curr_stock += truck.actual_load
+                truck.actual_load = 0
+                self.restocking[warehouse.pos] = False
+            elif kind == 'return':
+                truck.route = ()
+
+    #==========================================
+    # SUMMARY OF FINANCES
+    def summary(self):
         self.cum_demand = np.sum(self.daily_demand)
         self.cum_sales = np.sum(self.daily_sales)
         self.cum_revenue = np.sum(self.daily_revenue)
         self.cum_opp_cost = np.sum(self.daily_opp_cost)
-        self.daily_profit = np.subtract(self.daily_revenue, self.daily_delivery_cost)
         self.cum_profit= np.sum(self.daily_profit)
         self.cum_delivery_cost = np.sum(self.daily_delivery_cost)
 
-
-        # plot costs and save output
-        daily_fig, cum_fig = plot_costs(self.daily_opp_cost, self.daily_delivery_cost)
-        daily_fig.savefig(self.tag +'_'+  self.var +'_daily_costs.png')
-        cum_fig.savefig(self.tag +'_'+  self.var +'_cum_costs.png')
-
-        # plot revenue, total cost and profit
-        daily_fig, cum_fig = plot_finances(self.daily_revenue, self.daily_delivery_cost, self.daily_profit)
-        daily_fig.savefig(self.tag +'_'+  self.var +'_daily_finances.png')
-        cum_fig.savefig(self.tag +'_'+  self.var +'_cum_finances.png')
-
-        # plot warehouse stock
-        daily_fig, cum_fig = plot_warehouse_stock(self.daily_stock_W1, self.daily_stock_W2)
-        daily_fig.savefig(self.tag +'_'+  self.var +'_daily_warehouse_stock.png')
-        cum_fig.savefig(self.tag +'_'+  self.var +'_cum_warehouse_stock.png')
-
-        # plot deliveries
-        daily_fig, cum_fig = plot_deliveries(self.daily_warehouse_deliveries,
-                                             self.daily_store_deliveries)
-        daily_fig.savefig(self.tag +'_'+  self.var +'_daily_deliveries.png')
-        cum_fig.savefig(self.tag +'_'+ self.var +'_cum_deliveries.png')
-
-        # close all figures
-        plt.close('all')
+    #=== OUTPUT
+    # prefix of the output files of the run
+    def prefix(self):
+        return(self.tag +'_'+ self.var)
+
+    # daily history of the run (views of the recorder arrays)
+    def results(self):
+        results = self.recorder.columns()
+        results['prefix'] = self.prefix()
+        return(results)
+
+    # save daily history for rendering later (see post_process.render_files)
+    def save_results(self, path=None):
+        if path is None:
+            path = self.prefix() +'_results.npz'
+        return(self.recorder.export_npz(path, prefix=self.prefix()))
+
+    # plot and save all figures of the run
+    def render(self):
+        render_results(self.results(), self.prefix())
+
+    #=== PROFILING
+    # time the handlers from now on (calls, wall time, per day times and with
+    # memory=True allocations), the report is printed at the end of
+    # advance_time and saved as JSON if a path is given
+    def enable_profiling(self, memory=False, path=None):
+        if self.profiler is None or self.profiler.memory != memory:
+            self.profiler = handler_profiler(memory=memory)
+        self.profiler.attach(self)
+        self.profile_path = path
+
+    # stop timing (the profiler keeps the times recorded so far)
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.detach()
+
+    def profile_report(self):
+        print(self.profiler.table())
+        if self.profile_path is not None:
+            self.profiler.save(self.profile_path)
+
+    #=== CHECKPOINTS
+    # state of the run at the end of the last day: stocks, trucks, warnings,
+    # demand stream and history (arrays only, see save_checkpoint)
+    def checkpoint(self):
+        snapshot = self.recorder.columns()
+        snapshot['checkpoint_version'] = np.array(checkpoint_version)
+        snapshot['store_stock'] = self.net.store_state.curr_stock.copy()
+        snapshot['warehouse_stock'] = self.net.warehouse_state.curr_stock.copy()
+        snapshot['truck_ids'] = np.array([truck.id for truck in self.T])
+        snapshot['truck_on_hold'] = np.array([truck.on_hold for truck in self.T])
+        snapshot['truck_load'] = np.array([truck.actual_load for truck in self.T], dtype=float)
+        snapshot['truck_routes'] = np.array(json.dumps([[node.id for node in truck.route] for truck in self.T]))
+        snapshot['warnings_low'] = self.warnings.low.copy()
+        snapshot['warnings_zero'] = self.warnings.zero.copy()
+        snapshot['warnings_pending'] = self.warnings.pending.copy()
+        snapshot['restocking'] = self.restocking.copy()
+        snapshot['events'] = np.array(json.dumps(self.events.dump()))
+        snapshot['demand_kind'] = np.array(self.demand.kind)
+        snapshot['demand_products'] = np.array(json.dumps(self.demand.products))
+        snapshot['demand_state'] = np.array(json.dumps(self.demand.state))
+        snapshot['prefix'] = np.array(self.prefix())
+        return(snapshot)
+
+    # continue the run from a snapshot (checkpoint() or a file saved by
+    # save_checkpoint); the case of the simulation may differ from the one
+    # of the snapshot to fork what-if runs, they share the random stream
+    def restore(self, snapshot):
+        if not isinstance(snapshot, dict):
+            with np.load(snapshot) as data:
+                snapshot = dict(data)
+        if int(snapshot['checkpoint_version']) != checkpoint_version:
+            raise ValueError('unsupported checkpoint version: '+str(snapshot['checkpoint_version']))
+        # the position of the demand stream only applies to the same demand
+        saved = (str(snapshot['demand_kind']), tuple(json.loads(str(snapshot['demand_products']))))
+        if saved != (self.demand.kind, self.demand.products):
+            raise ValueError('checkpoint of %s demand cannot be restored with %s demand'
+                             % (demand_label(*saved), demand_label(self.demand.kind, self.demand.products)))
+        self.recorder.restore(snapshot)
+        self.net.store_state.curr_stock[:] = snapshot['store_stock']
+        self.net.warehouse_state.curr_stock[:] = snapshot['warehouse_stock']
+        # trucks are matched by id (trucks missing in the snapshot keep their state)
+        nodes = self.net.by_id
+        routes = json.loads(str(snapshot['truck_routes']))
+        saved = dict((str(truck_id), index) for index, truck_id in enumerate(snapshot['truck_ids']))
+        for truck in self.T:
+            if truck.id in saved:
+                index = saved[truck.id]
+                truck.on_hold = int(snapshot['truck_on_hold'][index])
+                truck.actual_load = float(snapshot['truck_load'][index])
+                truck.route = tuple(nodes[node_id] for node_id in routes[index])
+        self.warnings.low[:] = snapshot['warnings_low']
+        self.warnings.zero[:] = snapshot['warnings_zero']
+        self.warnings.pending[:] = snapshot['warnings_pending']
+        self.restocking[:] = snapshot['restocking']
+        self.events.load(json.loads(str(snapshot['events'])))
+        self.demand.state = json.loads(str(snapshot['demand_state']))
+        self.summary()
+
+    # save snapshot as a compressed .npz file
+    def save_checkpoint(self, path=None):
+        if path is None:
+            path = self.prefix() +'_checkpoint.npz'
+        np.savez_compressed(path, **self.checkpoint())
+        return(path)
 
 #================
 # EVENT HANDLERS
 
     #=== SALES
-    def store_iterator(self):
-        day_demand, day_sales, day_revenue, day_opp_cost = 0,0,0,0
-        for store in S:
-            # get demand for individual store
-            demand = generate_demand(store)
-            # balance sales for individual store
-            eff_sales, miss_sales = self.balance_sales(demand, store)
-            # update store info
-            store.eff_sales.append(eff_sales)
-            store.miss_sales.append(miss_sales)
-            # check stock and issue call for restock
-            self.inventory_check(store)
-            # update info of the day
-            day_demand += demand
-            day_sales += eff_sales
-            day_revenue += eff_sales * self.price_per_unit
-            day_opp_cost += miss_sales * self.price_per_unit
+    def store_iterator(self, store_demand):
+        # balance sales for all stores at once
+        eff_sales, miss_sales = self.balance_sales(store_demand, self.net.store_state)
+        # update store info
+        self.recorder.store_sales[self.recorder.days-1] = eff_sales
+        self.recorder.store_missed_sales[self.recorder.days-1] = miss_sales
+        # check stock and issue call for restock
+        self.inventory_check(self.net.store_state)
+        # update info of the day
+        day_demand = np.sum(store_demand)
+        day_sales = np.sum(eff_sales)
+        day_revenue = day_sales * self.price_per_unit
+        day_opp_cost = np.sum(miss_sales) * self.price_per_unit
         return(day_demand,day_sales,day_revenue,day_opp_cost)
 
     #=== SUPPLY CHAIN
@@ -190,9 +511,11 @@ class simulation:
         w_del, w_miles, w_del_cost = self.restock_warehouses()
         # restock stores if necessary
         s_del, s_miles, s_del_cost = self.restock_stores()
-        # clear trucks routes at the end of the day
-        for truck in self.T:
-            truck.route=()
+        # clear trucks routes at the end of the day (trucks on a trip clear
+        # their route when they are back, see dispatch)
+        if self.truck_speed is None:
+            for truck in self.T:
+                truck.route=()
         # update variables of the day
         day_warehouse_deliveries = w_del
         day_store_deliveries = s_del
@@ -206,30 +529,19 @@ class simulation:
     #============================
     # MANAGE STORES & WAREHOUSES
 
-    # compute local effective and missed sales
-    def balance_sales(self,demand, store):
-        # stock meets demand
-        if demand <= store.curr_stock:
-            eff_sales = demand
-            miss_sales = 0
-            store.curr_stock -= demand
-        # stock is insufficient and sales are missed
-        else:
-            eff_sales = store.curr_stock
-            miss_sales = (demand - store.curr_stock)
-            store.curr_stock = 0
+    # compute local effective and missed sales (vectors over all stores)
+    def balance_sales(self,demand, state):
+        # sales are limited by the stock, the rest are missed
+        eff_sales = np.minimum(demand, state.curr_stock)
+        miss_sales = demand - eff_sales
+        state.curr_stock -= eff_sales
         return(eff_sales,miss_sales)
 
-    # check if stock is low and issue warning
-    def inventory_check(self,store):
-        if store.curr_stock <= store.min_stock:
-            if not store in self.low_stock_warning and not store.curr_stock == 0:
-                self.low_stock_warning.append(store)
-            elif store.curr_stock == 0 and not store in self.zero_stock_warning:
-                self.zero_stock_warning.append(store)
-        # remove duplicates
-        if store in self.low_stock_warning and store in self.zero_stock_warning:
-            self.low_stock_warning.remove(store)
+    # check if stock is low and issue warning (flags all stores at once)
+    def inventory_check(self,state):
+        low_stock = state.curr_stock <= state.min_stock
+        self.warnings.update(low_stock & (state.curr_stock > 0),
+                             low_stock & (state.curr_stock == 0))
 
 
     #===================
@@ -243,9 +555,9 @@ class simulation:
             # check whether truck can leave according to schedule and availability
             if truck.on_hold >= self.interval and not truck.route:
                 # loop over warehouses
-                for warehouse in W:
+                for warehouse in self.net.W:
                     # check if current stock is smaller than minimum
-                    if warehouse.curr_stock <= warehouse.min_stock:
+                    if warehouse.curr_stock <= warehouse.min_stock and not self.restocking[warehouse.pos]:
                         # reset on hold counter
                         truck.on_hold = 1
                         # get parent production plant
@@ -253,7 +565,7 @@ class simulation:
                         # assign truck route
                         truck.route = (warehouse,parent_plant,warehouse)
                         # calculate distance warehouse/parent plant/warehouse
-                        path_dist = 2.*G[warehouse.x,warehouse.y][parent_plant.x,parent_plant.y]['length']
+                        path_dist = 2.*self.net.D[warehouse.idx, parent_plant.idx]
                         # number of products on delivery order
                         order = (warehouse.capacity*(warehouse.refill_pc/100.0))- warehouse.curr_stock
                         if order > truck.capacity:
@@ -270,6 +582,9 @@ class simulation:
                         n_trips += 1
                         # perform delivery
                         self.delivery(truck,'W_RESTOCK')
+                        # truck is away until it is back from the plant
+                        if self.truck_speed is not None:
+                            break
             elif not truck.route:
                 # update truck on hold days
                 truck.on_hold  += 1
@@ -279,16 +594,21 @@ class simulation:
     # restock stores
     def restock_stores(self):
         n_trips, mileage, delivery_cost = 0, 0, 0
+        # stores that need restocking and the routes of the trucks that can leave
+        # (according to schedule and availability), planned once for the day
+        stores_w_warning = [self.net.S[index] for index in self.warnings.candidates()]
+        ready = [truck for truck in self.T if truck.on_hold >= self.interval and not truck.route]
+        plan = self.delivery_plan(ready, stores_w_warning)
+        # stores not routed yet
+        n_left = len(stores_w_warning)
         for truck in self.T:
-            # get list of stores that need restocking
-            stores_w_warning = self.low_stock_warning + self.zero_stock_warning
-            if len(stores_w_warning) > 0:
-                # check whether truck can leave (according to schedule and availability)
+            if n_left > 0:
                 if truck.on_hold >=self.interval and not truck.route:
                     # update on hold counter
                     truck.on_hold  = 1
                     # get route for truck
-                    route_dist, truck.route = self.delivery_route(truck, stores_w_warning)
+                    route_dist, truck.route = plan.pop(0)
+                    n_left -= len(truck.route) - 2
                     # compile order for stores
                     order = 0
                     for store in truck.route[1:-1]:
@@ -315,31 +635,24 @@ class simulation:
 
     # computes optimal route between for all store combinations
     def optimal_routes(self):
-        # iterate over combination sizes
-        opt_routes = []
-        for comb_size in range(1,self.max_stores+1):
-            # get all possible combinations of stores for a combination size
-            all_comb = list(combinations(S, comb_size))
-            # loop over all poss. combinations to get permutations
-            for comb in all_comb:
-                all_perm = []
-                # get permutations with warehouses included
-                perm = list(permutations(comb,len(comb)))
-                for warehouse in W:
-                    for p in perm:
-                        all_perm.append((warehouse,)+p+(warehouse,))
-                # path distances
-                path_dist = [0]*len(all_perm)
-                for index in range(len(all_perm)):
-                    for p in range(len(all_perm[index])-1):
-                        path_dist[index]+=G[all_perm[index][p].x, all_perm[index][p].y][all_perm[index][p+1].x, all_perm[index][p+1].y]['length']
-                # get shortest route
-                shortest_dist = min(path_dist)
-                shortest_index = path_dist.index(shortest_dist)
-                shortest_route = all_perm[shortest_index]
-                # append shortest route to global optimal routes
-                opt_routes.append([shortest_dist, shortest_route])
-        return(opt_routes)
+        # shortest route for every combination of up to max_stores stores,
+        # indexed by their combination of stores and shared by all simulations
+        return(shared_route_table([w.idx for w in self.net.W], [s.idx for s in self.net.S], self.net.D,
+                                  self.max_stores, self.route_solver))
+
+    # routes used for dispatching (lazy cache or full table)
+    def delivery_routes(self):
+        if self.opt_routes is None:
+            if self.routing == 'table':
+                self.opt_routes = self.optimal_routes()
+            elif self.routing == 'heuristic':
+                # routes built for the stores with warnings of each dispatch
+                self.opt_routes = heuristic_router([w.idx for w in self.net.W], self.net.D,
+                                                   self.route_construction, self.route_time_budget)
+            else:
+                # store combinations are solved on first request only
+                self.opt_routes = shared_route_cache([w.idx for w in self.net.W], self.net.D, self.route_solver)
+        return(self.opt_routes)
 
 
 
@@ -350,24 +663,40 @@ class simulation:
             comb_size = len(list_stores)
         else:
             comb_size = truck.max_stores
-        # get possible combinations of stores in list
-        all_comb = []
-        stores_comb = list(combinations(list_stores, comb_size))
-        for comb in stores_comb:
-            for warehouse in W:
-                all_comb.append(set((warehouse,)+comb))
-        # get corresponding optimal routes for each combination
-        subset_opt_routes = [route for route in self.opt_routes if set(route[1]) in all_comb]
-        # select shortest route in subset of optimal routes
-        subset_opt_routes_dist = [route[0] for route in subset_opt_routes]
-        shortest_dist = min(subset_opt_routes_dist)
-        shortest_index = subset_opt_routes_dist.index(shortest_dist)
-        shortest_route = subset_opt_routes[shortest_index][1]
+        # shortest route over the combinations of stores in list
+        shortest_dist, route = self.delivery_routes().best_route([store.idx for store in list_stores], comb_size,
+                                                                 self.neighbourhood)
+        shortest_route = tuple(self.net.nodes[idx] for idx in route)
         return(shortest_dist, shortest_route)
 
 
+    # routes of the trucks over disjoint combinations of the stores, as if
+    # the trucks left one after the other on the stores not routed yet
+    # (all combinations are looked up once for the whole fleet); with the
+    # 'zero_first' policy the zero stock stores are routed first and the
+    # trucks left over serve the low stock stores
+    def delivery_plan(self, trucks, list_stores):
+        if not trucks or not list_stores:
+            return []
+        if self.warnings.policy == 'zero_first':
+            groups = ([store for store in list_stores if self.warnings.zero[store.pos]],
+                      [store for store in list_stores if not self.warnings.zero[store.pos]])
+        else:
+            groups = (list_stores,)
+        plan = []
+        for group in groups:
+            if group and len(plan) < len(trucks):
+                plan += self.delivery_routes().plan([store.idx for store in group], self.max_stores,
+                                                    len(trucks) - len(plan), self.neighbourhood)
+        return [(dist, tuple(self.net.nodes[idx] for idx in route)) for dist, route in plan]
+
+
     # update parameters upon dispatching trucks
     def delivery(self, truck, route_type):
+        # trips with travel times deliver on arrival
+        if self.truck_speed is not None:
+            self.dispatch(truck, route_type)
+            return
         # get warehouse of origin
         origin = truck.route[0]
         # delivery warehouse/plant/warehouse
@@ -382,26 +711,54 @@ class simulation:
             origin.curr_stock -= truck.actual_load
             # unload content along the route (first come / first serve)
             for store in truck.route[1:-1]:
-                # products requested by store
-                order = (store.capacity * (store.refill_pc/100.0)) - store.curr_stock
-                # actual restock
-                if truck.actual_load >= order:
-                    actual_restock = order
-                else:
-                    actual_restock = truck.actual_load
-                # update store stock
-                store.curr_stock += actual_restock
-                # update truck load
-                truck.actual_load -= actual_restock
-                # check new store stock and verify it can be removed from low_stock + zero_stock list
-                if store.curr_stock >= store.min_stock:
-                    try:
-                        self.low_stock_warning.remove(store)
-                    except:pass
-                elif store.curr_stock > 0:
-                    # add it to the list of low stock stores
-                    self.low_stock_warning.append(store)
-                    # remove it from the zero stock
-                    try:
-                        self.zero_stock_warning.remove(store)
-                    except:pass
\ No newline at end of file
+                self.unload(truck, store)
+
+    # unload products of a truck at a store
+    def unload(self, truck, store):
+        # products requested by store
+        order = (store.capacity * (store.refill_pc/100.0)) - store.curr_stock
+        # actual restock
+        if truck.actual_load >= order:
+            actual_restock = order
+        else:
+            actual_restock = truck.actual_load
+        # update store stock
+        store.curr_stock += actual_restock
+        # update truck load
+        truck.actual_load -= actual_restock
+        # check new store stock and verify it can be removed from low_stock + zero_stock warnings
+        if store.curr_stock >= store.min_stock:
+            self.warnings.clear(store.pos)
+        elif store.curr_stock > 0:
+            # move it from zero stock to low stock
+            self.warnings.flag_low(store.pos)
+
+    # schedule the trip of a truck leaving today (events at the arrival times)
+    def dispatch(self, truck, route_type):
+        day = self.recorder.days - 1
+        route = truck.route
+        # delivery warehouse/plant/warehouse, products arrive with the truck
+        if route_type == 'W_RESTOCK':
+            warehouse = route[0]
+            self.restocking[warehouse.pos] = True
+            day += self.travel_time(route[0], route[1]) + self.travel_time(route[1], route[2])
+            self.events.push(day, 'restock', truck.id, warehouse.id)
+        # delivery warehouse/[stores]/warehouse
+        elif route_type == 'S_RESTOCK':
+            route[0].curr_stock -= truck.actual_load
+            for previous, store in zip(route[:-2], route[1:-1]):
+                day += self.travel_time(previous, store)
+                self.warnings.pending[store.pos] = True
+                self.events.push(day, 'arrival', truck.id, store.id)
+            day += self.travel_time(route[-2], route[-1])
+        self.events.push(day, 'return', truck.id)
+
+    # travel time between two entities (days)
+    def travel_time(self, origin, destination):
+        return self.net.D[origin.idx, destination.idx] / (24. * self.truck_speed)
+
+# new simulation of a case resumed from a snapshot (see simulation.restore)
+def from_checkpoint(case, snapshot, net=None):
+    sim = simulation(case, net)
+    sim.restore(snapshot)
+    return(sim)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+BENCHMARK
+==============================================================================
+DESCRIPTION
+    This script implements the benchmark suite of the simulator: route
+    tables, dispatch, the handlers of a day and full runs, each timed on
+    networks of 20 (store_info.csv), 200 and 2000 stores. Results are saved
+    as JSON, one record per benchmark and parameters, so that runs of
+    different commits can be compared:
+
+        python benchmark.py                          run all, save results
+        python benchmark.py --stores 20 200 --only routes dispatch
+        python benchmark.py --compare old.json new.json
+        python benchmark.py --gap                    heuristic against exact routes
+
+    Benchmarks that are infeasible at a size (e.g. route tables with
+    millions of combinations) are recorded as skipped with the reason.
+
+CREATED
+    10/18/2026
+"""
+
+import os, time, json, platform, argparse, subprocess
+import numpy as np
+from math import comb
+import routing
+from parameter_study import case, baseline, simulation
+from topology import load_default_network
+from synthetic import synthetic_network
+from roads import grid_roads
+
+#==========
+# NETWORKS
+
+# store counts of the benchmarks
+store_counts = (20, 200, 2000)
+
+networks = {}
+
+# network with n_stores stores (20: store_info.csv, others: synthetic
+# network with two warehouses and plants, see synthetic.py)
+def bench_network(n_stores, seed=0):
+    if n_stores not in networks:
+        if n_stores == len(load_default_network().S):
+            networks[n_stores] = load_default_network()
+        else:
+            networks[n_stores] = synthetic_network(n_stores, seed=seed)
+    return networks[n_stores]
+
+# simulation of the baseline case on a network with n_stores stores
+def bench_simulation(n_stores, **params):
+    values = dict(n_trucks=baseline.n_trucks, interval=baseline.interval, base_cost=baseline.base_cost,
+                  cost_per_mile=baseline.cost_per_mile, max_stores=baseline.max_stores,
+                  min_percent=baseline.min_percent, tag='benchmark', headless=True)
+    values.update(params)
+    return simulation(case(**values), bench_network(n_stores))
+
+#============
+# BENCHMARKS
+
+# route table of all combinations of up to max_stores stores (no cache)
+def setup_routes(n_stores, max_stores):
+    routing.route_tables.clear()
+    sim = bench_simulation(n_stores, max_stores=max_stores, routing='table')
+    return (sim,)
+
+def time_routes(sim):
+    sim.optimal_routes()
+
+def skip_routes(n_stores, max_stores):
+    n_routes = sum(comb(n_stores, size) for size in range(1, max_stores+1))
+    if n_routes > 2e6:
+        return '%d store combinations' % n_routes
+
+# route of a single dispatch over 10 stores with warnings (lazy routing)
+def setup_dispatch(n_stores, cache):
+    sim = bench_simulation(n_stores, routing='lazy')
+    stores = [sim.net.S[pos] for pos in np.random.default_rng(0).choice(n_stores, 10, replace=False)]
+    routing.route_caches.clear()
+    if cache == 'warm':
+        sim.delivery_route(sim.T[0], stores)
+    return (sim, stores)
+
+def time_dispatch(sim, stores):
+    sim.delivery_route(sim.T[0], stores)
+
+# routes of a fleet over 30 stores with warnings (lazy routing, warm cache)
+def setup_dispatch_plan(n_stores, n_trucks):
+    sim = bench_simulation(n_stores, n_trucks=n_trucks, routing='lazy')
+    stores = [sim.net.S[pos] for pos in np.random.default_rng(0).choice(n_stores, min(n_stores, 30), replace=False)]
+    sim.delivery_plan(sim.T, stores)
+    return (sim, stores)
+
+def time_dispatch_plan(sim, stores):
+    sim.delivery_plan(sim.T, stores)
+
+# routes of 10 trucks over 60 stores with warnings, combinations pruned to
+# stores within radius (lazy routing, warm cache)
+def setup_pruned_plan(n_stores, radius):
+    sim = bench_simulation(n_stores, n_trucks=10, routing='lazy', route_radius=radius)
+    stores = [sim.net.S[pos] for pos in np.random.default_rng(0).choice(n_stores, min(n_stores, 60), replace=False)]
+    sim.delivery_plan(sim.T, stores)
+    return (sim, stores)
+
+def time_pruned_plan(sim, stores):
+    sim.delivery_plan(sim.T, stores)
+
+# heuristic routes of 40 trucks over 100 stores with warnings
+def setup_heuristic_plan(n_stores, construction, max_stores):
+    sim = bench_simulation(n_stores, n_trucks=40, max_stores=max_stores, routing='heuristic',
+                           route_construction=construction)
+    stores = [sim.net.S[pos] for pos in np.random.default_rng(0).choice(n_stores, min(n_stores, 100), replace=False)]
+    return (sim, stores)
+
+def time_heuristic_plan(sim, stores):
+    sim.delivery_plan(sim.T, stores)
+
+# sales of all stores for one day
+def setup_store_iterator(n_stores):
+    sim = bench_simulation(n_stores)
+    sim.recorder.next_day()
+    return (sim, sim.demand.draw(1)[0])
+
+def time_store_iterator(sim, store_demand):
+    sim.store_iterator(store_demand)
+
+# logistics of one day with 10 stores below minimum stock (routes cached)
+def setup_supply_chain(n_stores):
+    sim = bench_simulation(n_stores, routing='lazy')
+    sim.recorder.next_day()
+    state = sim.net.store_state
+    for pos in np.random.default_rng(0).choice(n_stores, 10, replace=False):
+        state.curr_stock[pos] = state.min_stock[pos]
+        sim.warnings.flag_low(pos)
+    return (sim,)
+
+def time_supply_chain(sim):
+    sim.supply_chain()
+
+# shortest paths between all entities on grid streets (no cache)
+def setup_road_distances(n_stores):
+    net = bench_network(n_stores)
+    width, height = np.max([(node.x, node.y) for node in net.nodes], axis=0)
+    return (grid_roads(width, height), [(node.x, node.y) for node in net.nodes])
+
+def time_road_distances(roads, points):
+    roads.distances(points)
+
+# routing of the full runs: name (benchmark parameter) -> case parameters
+run_routing = {'lazy': {'routing': 'lazy'},
+               'table': {'routing': 'table'},
+               'heuristic': {'routing': 'heuristic'},
+               'lazy_neighbours': {'routing': 'lazy', 'route_neighbours': 8},
+               'heuristic_neighbours': {'routing': 'heuristic', 'route_neighbours': 8}}
+
+# full run of the baseline case (the route table is built before timing)
+def setup_advance_time(n_stores, n_days, routing):
+    sim = bench_simulation(n_stores, **run_routing[routing])
+    sim.delivery_routes()
+    return (sim, n_days)
+
+def time_advance_time(sim, n_days):
+    sim.advance_time(n_days)
+
+def skip_advance_time(n_stores, n_days, routing):
+    if routing == 'table' and skip_routes(n_stores, baseline.max_stores):
+        return skip_routes(n_stores, baseline.max_stores)
+    # about 700 s (table) and over 1500 s (lazy) for 90 days at 200 stores
+    if routing in ('lazy', 'table') and n_stores > 20:
+        return 'dispatch over all combinations of the stores with warnings'
+
+# name: (setup, timed function, skip, parameters, repeats)
+benchmarks = {
+    'routes': (setup_routes, time_routes, skip_routes,
+               {'max_stores': (1, 2, 3, 4, 5)}, 3),
+    'dispatch': (setup_dispatch, time_dispatch, None,
+                 {'cache': ('cold', 'warm')}, 5),
+    'dispatch_plan': (setup_dispatch_plan, time_dispatch_plan, None,
+                      {'n_trucks': (1, 10, 100)}, 5),
+    'pruned_plan': (setup_pruned_plan, time_pruned_plan, None,
+                    {'radius': (None, 20, 10, 5)}, 5),
+    'heuristic_plan': (setup_heuristic_plan, time_heuristic_plan, None,
+                       {'construction': ('savings', 'nearest_neighbour'), 'max_stores': (3, 8)}, 5),
+    'store_iterator': (setup_store_iterator, time_store_iterator, None, {}, 20),
+    'supply_chain': (setup_supply_chain, time_supply_chain, None, {}, 10),
+    'road_distances': (setup_road_distances, time_road_distances, None, {}, 3),
+    'advance_time': (setup_advance_time, time_advance_time, skip_advance_time,
+                     {'n_days': (90, 365), 'routing': tuple(run_routing)}, 3),
+    }
+
+#===========
+# EXECUTION
+
+# time a benchmark for all its parameters, returns one record per parameters
+def run_benchmark(name, n_stores):
+    setup, func, skip, params, repeat = benchmarks[name]
+    records = []
+    grid = [{}]
+    for param, values in params.items():
+        grid = [dict(point, **{param: value}) for point in grid for value in values]
+    for point in grid:
+        record = {'name': name, 'params': dict(point, n_stores=n_stores)}
+        reason = skip(n_stores, **point) if skip is not None else None
+        if reason:
+            record.update(status='skipped', reason=reason)
+        else:
+            times = []
+            for i in range(repeat):
+                # setup is not timed
+                args = setup(n_stores, **point)
+                start = time.perf_counter()
+                func(*args)
+                times.append(time.perf_counter() - start)
+            record.update(status='ok', times=times, min=min(times),
+                          median=float(np.median(times)), mean=float(np.mean(times)))
+        records.append(record)
+    return records
+
+# commit, interpreter and machine of a run
+def run_info():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(),
+            'system': platform.system()}
+
+# run benchmarks on all store counts and save results as JSON
+def run_benchmarks(names=None, stores=store_counts, path=None):
+    if names is None:
+        names = list(benchmarks)
+    # route tables are computed, not loaded from disk
+    cache_dir, routing.route_cache_dir = routing.route_cache_dir, None
+    results = {'info': run_info(), 'results': []}
+    try:
+        for n_stores in stores:
+            for name in names:
+                for record in run_benchmark(name, n_stores):
+                    results['results'].append(record)
+                    print(format_record(record))
+    finally:
+        routing.route_cache_dir = cache_dir
+    if path is None:
+        path = os.path.join('benchmark_results', (results['info']['commit'] or 'local')[:12]+'.json')
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=1)
+    return path
+
+def format_record(record):
+    params = ' '.join('%s=%s' % item for item in sorted(record['params'].items()))
+    if record['status'] == 'skipped':
+        return '%-15s %-52s skipped (%s)' % (record['name'], params, record['reason'])
+    return '%-15s %-52s %12.6f s' % (record['name'], params, record['median'])
+
+# median time ratio new/old of the benchmarks of two result files
+# (ratios above threshold are flagged as regressions)
+def compare(old_path, new_path, threshold=1.2):
+    def medians(path):
+        with open(path) as file:
+            results = json.load(file)['results']
+        return dict(((record['name'], json.dumps(record['params'], sort_keys=True)), record['median'])
+                    for record in results if record['status'] == 'ok')
+    old, new = medians(old_path), medians(new_path)
+    ratios = []
+    for key in sorted(set(old) & set(new)):
+        ratio = new[key] / old[key]
+        ratios.append((key[0], json.loads(key[1]), old[key], new[key], ratio))
+        print('%-15s %-52s %12.6f %12.6f %7.2f %s' % (key[0], key[1], old[key], new[key], ratio,
+                                                     'REGRESSION' if ratio > threshold else ''))
+    return ratios
+
+# gap of the heuristic routes against the exact ones on the stores of
+# store_info.csv (see routing.route_gap), one row per construction and size
+def heuristic_gap(max_stores=(2, 3, 4, 5), n_warned=12, n_samples=50, seed=0):
+    net = load_default_network()
+    warehouses, stores = [w.idx for w in net.W], [s.idx for s in net.S]
+    rows = []
+    print('%-18s %10s %12s %12s %12s' % ('construction', 'max_stores', 'route mean', 'route max', 'tour mean'))
+    for construction in ('nearest_neighbour', 'savings'):
+        router = routing.heuristic_router(warehouses, net.D, construction)
+        for size in max_stores:
+            gap = routing.route_gap(router, warehouses, stores, net.D, size, n_warned, n_samples, seed)
+            rows.append({'construction': construction, 'max_stores': size,
+                         'route': gap['route'].tolist(), 'tour': gap['tour'].tolist()})
+            print('%-18s %10d %11.1f%% %11.1f%% %11.1f%%' % (construction, size, 100*gap['route'].mean(),
+                                                            100*gap['route'].max(), 100*gap['tour'].mean()))
+    return rows
+
+#===========
+# EXECUTE
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark suite of the simulator')
+    parser.add_argument('--stores', type=int, nargs='+', default=store_counts)
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks))
+    parser.add_argument('--output')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--gap', action='store_true', help='gap of the heuristic routes')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    elif args.gap:
+        heuristic_gap()
+    else:
+        print('results saved in', run_benchmarks(args.only, args.stores, args.output))
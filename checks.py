@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+CHECKS
+==============================================================================
+DESCRIPTION
+    This script implements the consistency checks of the simulator: results
+    that two code paths must give identically by construction are compared
+    on small cases, and a mismatch raises an AssertionError:
+
+        routes     Held-Karp against brute force routes (dist, origin, order)
+                   on store_info.csv and on random integer grids with ties
+        route_file route table written to and memory-mapped from route_cache_dir
+                   against the table in memory (moving a store or a warehouse
+                   or changing max_stores gives another file)
+        roads      road distances of a grid of streets against the Manhattan
+                   distances (a disconnected road network is rejected)
+        resume     run resumed from a checkpoint file against the uninterrupted
+                   run (daily and event scheduler, truck trips, heuristic routes);
+                   a snapshot of another kind of demand is rejected
+        replay     replayed sales history in chunks of days and blocks of days
+                   run (daily and event scheduler) against a single run
+        pruning    route_radius / route_neighbours that prune no combination
+                   against the unpruned run (lazy, table, heuristic routes)
+        scheduler  event scheduler against the daily scheduler (instant trips)
+        warnings   'zero_first' warning_policy hands the zero stock stores to
+                   restock_stores first and routes them before low stock stores
+        export     history saved as .npz (save_results) and Parquet read back
+                   against the recorder columns (Parquet skipped without pyarrow)
+        replicas   every Monte Carlo replica against a simulation of its seed
+                   (cases with truck trips are rejected)
+
+        python checks.py                    run all checks
+        python checks.py --only routes
+
+CREATED
+    10/18/2026
+"""
+
+import os, argparse, tempfile
+import numpy as np
+import routing
+from routing import brute_force_routes, held_karp_routes
+import roads
+from roads import road_network, grid_roads
+from topology import network, load_default_network
+from synthetic import reference_grid
+from parameter_study import case, baseline, simulation, from_checkpoint
+from replicas import replica_simulation
+from demand import spawn_seeds
+from recorder import metrics
+
+#========
+# ROUTES
+
+# Manhattan distances between random integer points of a small grid (many
+# routes of the same length), warehouses first
+def random_grid(n_warehouses, n_stores, size, rng):
+    coords = rng.integers(0, size, (n_warehouses + n_stores, 2))
+    D = np.abs(coords[:,None,:] - coords[None,:,:]).sum(axis=2).astype(float)
+    return list(range(n_warehouses)), list(range(n_warehouses, n_warehouses + n_stores)), D
+
+# identical routes of both solvers (ties included)
+def compare_routes(warehouses, stores, D, max_stores, label):
+    exact = brute_force_routes(warehouses, stores, D, max_stores)
+    routes = held_karp_routes(warehouses, stores, D, max_stores)
+    for name, expected, result in zip(('dist', 'origin', 'order'), exact, routes):
+        if not np.array_equal(expected, result):
+            raise AssertionError('held_karp %s differs from brute_force (%s, max_stores=%d)'
+                                 % (name, label, max_stores))
+
+def check_routes(n_grids=30, seed=0):
+    net = load_default_network()
+    warehouses, stores = [w.idx for w in net.W], [s.idx for s in net.S]
+    for max_stores in range(1, 5):
+        compare_routes(warehouses, stores, net.D, max_stores, 'store_info.csv')
+    rng = np.random.default_rng(seed)
+    for grid in range(n_grids):
+        warehouses, stores, D = random_grid(int(rng.integers(1, 4)), int(rng.integers(3, 9)), 4, rng)
+        compare_routes(warehouses, stores, D, int(rng.integers(1, 5)), 'random grid %d' % grid)
+
+# routes of every combination of stores identical in the table written by
+# save_routes and read back by load_routes, and a file per topology
+def check_route_file(max_stores=3):
+    net = load_default_network()
+    warehouses, stores = [w.idx for w in net.W], [s.idx for s in net.S]
+    memory = routing.route_index(*held_karp_routes(warehouses, stores, net.D, max_stores))
+    # other topologies: a store moved, a warehouse moved, max_stores changed
+    moved_store = net.store_info.copy()
+    moved_store[0, 1] += 1
+    moved_warehouse = [(spec[0], spec[1] + 1) + tuple(spec[2:]) if i == 0 else spec
+                       for i, spec in enumerate(net.warehouse_spec)]
+    topologies = [(network(moved_store), max_stores), (network(net.store_info, warehouses=moved_warehouse), max_stores),
+                  (net, max_stores + 1)]
+    cache_dir = routing.route_cache_dir
+    with tempfile.TemporaryDirectory() as folder:
+        routing.route_cache_dir = folder
+        routing.route_tables.clear()
+        try:
+            routing.shared_route_table(warehouses, stores, net.D, max_stores)
+            paths = [os.path.join(folder, name) for name in os.listdir(folder)]
+            if len(paths) != 1:
+                raise AssertionError('%d route files written for one table' % len(paths))
+            loaded = routing.load_routes(paths[0])
+            for row in range(len(memory.dist)):
+                comb = [idx for idx in memory.order[row].tolist() if idx >= 0]
+                if loaded.best_route(comb, len(comb)) != memory.best_route(comb, len(comb)):
+                    raise AssertionError('route of stores %s differs in the route file' % comb)
+            del loaded
+            for other, other_max_stores in topologies:
+                routing.shared_route_table([w.idx for w in other.W], [s.idx for s in other.S], other.D,
+                                           other_max_stores)
+            if len(os.listdir(folder)) != 1 + len(topologies):
+                raise AssertionError('a moved store or warehouse or another max_stores reuses a route file')
+        finally:
+            # no table is left mapped to the removed files
+            routing.route_tables.clear()
+            routing.route_cache_dir = cache_dir
+
+#=======
+# ROADS
+
+# road distances of a grid of streets every km identical to the Manhattan
+# distances, and a network split in two halves rejected
+def check_roads():
+    # distance matrices are computed, not saved in road_cache_dir
+    cache_dir, roads.road_cache_dir = roads.road_cache_dir, None
+    try:
+        grid = grid_roads(*reference_grid)
+        if not np.array_equal(network(load_default_network().store_info, roads=grid).D, load_default_network().D):
+            raise AssertionError('road distances of the grid differ from the Manhattan distances')
+        # no street between x = 6 and x = 7
+        kept = grid.coords[grid.edges, 0].min(axis=1) != 6
+        split = road_network(grid.coords, grid.edges[kept], grid.lengths[kept])
+        try:
+            network(load_default_network().store_info, roads=split)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('a disconnected road network was accepted')
+    finally:
+        roads.road_cache_dir = cache_dir
+
+#=============
+# SIMULATIONS
+
+# baseline case with other parameters (lazy routing, no figures)
+def check_case(**params):
+    values = dict(n_trucks=baseline.n_trucks, interval=baseline.interval, base_cost=baseline.base_cost,
+                  cost_per_mile=baseline.cost_per_mile, max_stores=baseline.max_stores,
+                  min_percent=baseline.min_percent, tag='check', headless=True)
+    values.update(params)
+    return case(**values)
+
+# identical daily history of two simulations
+def compare_history(expected, result, label):
+    columns = result.recorder.columns()
+    for name, column in expected.recorder.columns().items():
+        if not np.array_equal(column, columns[name]):
+            raise AssertionError('%s differs (%s)' % (name, label))
+
+# run resumed from a checkpoint file identical to the uninterrupted run
+def check_resume(n_days=60, split=25):
+    for params in ({}, {'scheduler': 'events'}, {'scheduler': 'events', 'truck_speed': 20},
+                   {'routing': 'heuristic'}):
+        this_case = check_case(**params)
+        expected = simulation(this_case)
+        expected.advance_time(n_days)
+        first = simulation(this_case)
+        first.advance_time(split)
+        with tempfile.TemporaryDirectory() as folder:
+            resumed = from_checkpoint(this_case, first.save_checkpoint(os.path.join(folder, 'checkpoint.npz')))
+        resumed.advance_time(n_days - split)
+        compare_history(expected, resumed, 'resume %s' % params)
+    # snapshots are rejected by a simulation of another kind of demand
+    for saved, restored in (('replay', 'exponential'), ('exponential', 'replay')):
+        first = simulation(check_case(demand=saved))
+        first.advance_time(split)
+        try:
+            simulation(check_case(demand=restored)).restore(first.checkpoint())
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('a snapshot of %s demand was restored with %s demand' % (saved, restored))
+
+# replayed history identical whatever the chunks of days drawn, the blocks
+# of days run and the scheduler
+def check_replay():
+    expected = simulation(check_case(demand='replay'))
+    n_days = expected.demand.days_left
+    expected.advance_time(n_days)
+    for chunk_days in (1, 7, n_days):
+        for scheduler in ('daily', 'events'):
+            sim = simulation(check_case(demand='replay', scheduler=scheduler))
+            sim.demand.chunk_days = chunk_days
+            sim.advance_time(n_days // 3)
+            sim.advance_time(n_days - n_days // 3)
+            compare_history(expected, sim, 'replay chunk_days=%d, scheduler=%s' % (chunk_days, scheduler))
+
+# pruning of the store combinations that prunes none identical to no pruning
+def check_pruning(n_days=90):
+    n_stores = len(load_default_network().S)
+    for routing_mode in ('lazy', 'table', 'heuristic'):
+        expected = simulation(check_case(routing=routing_mode))
+        expected.advance_time(n_days)
+        for params in ({'route_radius': 1e9}, {'route_neighbours': n_stores},
+                       {'route_radius': 1e9, 'route_neighbours': n_stores}):
+            sim = simulation(check_case(routing=routing_mode, **params))
+            sim.advance_time(n_days)
+            compare_history(expected, sim, 'pruning %s, routing=%s' % (params, routing_mode))
+
+# event scheduler with instant trips identical to the daily scheduler
+def check_scheduler(n_days=120):
+    for n_trucks in (1, 4):
+        for interval in (1, 3):
+            for min_percent in (0., .5, .8):
+                params = dict(n_trucks=n_trucks, interval=interval, min_percent=min_percent)
+                daily = simulation(check_case(**params))
+                daily.advance_time(n_days)
+                events = simulation(check_case(scheduler='events', **params))
+                events.advance_time(n_days)
+                compare_history(daily, events, 'scheduler %s' % params)
+
+# with the 'zero_first' policy, restock_stores gets the zero stock stores
+# first and the trucks serve them before the low stock stores
+def check_warnings(n_days=120):
+    for routing_mode in ('lazy', 'heuristic'):
+        sim = simulation(check_case(n_trucks=2, min_percent=.5, routing=routing_mode,
+                                    warning_policy='zero_first'))
+        plan_routes, days_mixed = sim.delivery_plan, []
+        def delivery_plan(trucks, list_stores):
+            zero = [bool(sim.warnings.zero[store.pos]) for store in list_stores]
+            if zero != sorted(zero, reverse=True):
+                raise AssertionError('low stock stores handed before zero stock stores (%s)' % routing_mode)
+            plan = plan_routes(trucks, list_stores)
+            served = [any(sim.warnings.zero[store.pos] for store in route[1:-1]) for dist, route in plan]
+            if served != sorted(served, reverse=True):
+                raise AssertionError('low stock stores routed before zero stock stores (%s)' % routing_mode)
+            if any(zero) and not all(zero):
+                days_mixed.append(sim.recorder.days)
+            return plan
+        sim.delivery_plan = delivery_plan
+        sim.advance_time(n_days)
+        if not days_mixed:
+            raise AssertionError('no day with zero and low stock stores (%s)' % routing_mode)
+
+# history exported as .npz and Parquet identical to the recorder columns
+def check_export(n_days=40):
+    sim = simulation(check_case())
+    sim.advance_time(n_days)
+    recorder, columns = sim.recorder, sim.recorder.columns()
+    with tempfile.TemporaryDirectory() as folder:
+        with np.load(sim.save_results(os.path.join(folder, 'results.npz'))) as data:
+            saved = dict(data)
+        if str(saved.pop('prefix')) != sim.prefix():
+            raise AssertionError('prefix differs in the .npz file')
+        if sorted(saved) != sorted(columns):
+            raise AssertionError('arrays of the .npz file differ from the recorder columns')
+        for name, column in columns.items():
+            if not np.array_equal(saved[name], column):
+                raise AssertionError('%s differs in the .npz file' % name)
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            return
+        path, store_path = recorder.export_parquet(os.path.join(folder, 'results.parquet'))
+        table, stores = pq.read_table(path).to_pydict(), pq.read_table(store_path).to_pydict()
+        expected = dict(('daily_'+name, table[name]) for name in metrics)
+        expected['daily_warehouse_stock'] = np.transpose([table['stock_'+name] for name in recorder.warehouse_names])
+        expected['daily_store_sales'] = np.reshape(stores['sales'], (n_days, -1))
+        expected['daily_store_missed_sales'] = np.reshape(stores['missed_sales'], (n_days, -1))
+        for name, column in expected.items():
+            if not np.array_equal(column, columns[name]):
+                raise AssertionError('%s differs in the Parquet files' % name)
+        if table['day'] != list(range(n_days)) or stores['store'][:len(recorder.store_names)] != recorder.store_names:
+            raise AssertionError('days or stores differ in the Parquet files')
+
+# every replica identical to a simulation of the case with its seed
+def check_replicas(n_replicas=8, n_days=90, seed=0):
+    # route tables are computed, not saved in route_cache_dir
+    cache_dir, routing.route_cache_dir = routing.route_cache_dir, None
+    try:
+        for n_trucks in (1, 4):
+            for max_stores in (2, 3):
+                for min_percent in (.5, .8):
+                    this_case = check_case(n_trucks=n_trucks, max_stores=max_stores, min_percent=min_percent,
+                                           routing='table')
+                    replicas = replica_simulation(this_case, n_replicas, seed)
+                    replicas.advance_time(n_days)
+                    for replica, replica_seed in enumerate(spawn_seeds(seed, n_replicas)):
+                        this_case.seed = replica_seed
+                        sim = simulation(this_case)
+                        sim.advance_time(n_days)
+                        for name in metrics:
+                            if not np.array_equal(replicas.history[name][:, replica], sim.recorder.series(name)):
+                                raise AssertionError('daily_%s of replica %d differs (n_trucks=%d, max_stores=%d, '
+                                                     'min_percent=%g)' % (name, replica, n_trucks, max_stores,
+                                                                          min_percent))
+    finally:
+        routing.route_cache_dir = cache_dir
+    # trips of several days are not modelled by the replicas
+    try:
+        replica_simulation(check_case(routing='table', scheduler='events', truck_speed=5), n_replicas, seed)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('replicas accepted a case with truck trips')
+
+#===========
+# EXECUTION
+
+# name: check
+checks = {'routes': check_routes,
+          'route_file': check_route_file,
+          'roads': check_roads,
+          'resume': check_resume,
+          'replay': check_replay,
+          'pruning': check_pruning,
+          'scheduler': check_scheduler,
+          'warnings': check_warnings,
+          'export': check_export,
+          'replicas': check_replicas}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='consistency checks of the simulator')
+    parser.add_argument('--only', nargs='+', choices=list(checks))
+    args = parser.parse_args()
+    for name in args.only or list(checks):
+        checks[name]()
+        print('%-10s ok' % name)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+DEMAND
+==============================================================================
+DESCRIPTION
+    This script implements the demand models of the stores. The demand of
+    all stores is generated for a block of days at once as an array
+    (days x stores) that the simulation consumes day by day.
+
+        exponential_demand     random demand of the modelled distribution
+        replay_demand          historical daily sales (e.g. viz_input/sales_p1.csv)
+
+    Historical sales are parsed from the CSV files (one row per store, one
+    column per day) only once: the first read writes a binary cache
+    (days x stores) in sales_cache_dir that later runs memory-map, so only
+    the days drawn are read from disk.
+
+CREATED
+    10/18/2026
+"""
+
+import os, hashlib
+import numpy as np
+from storage import atomic_write
+
+#============
+# DATA MODEL
+
+# demand drawn from modelled exponential probability distribution for each store
+class exponential_demand:
+    kind = 'exponential'
+    # products of the demand (sales files replayed, none for modelled demand)
+    products = ()
+    # days drawn at once by the simulation (None: whole block)
+    chunk_days = None
+    # days left in the stream (None: unlimited)
+    days_left = None
+
+    def __init__(self, exp_sale, seed=None):
+        # mean daily demand of each store
+        self.scale = 1./np.asarray(exp_sale, dtype=float)
+        # random stream of the simulation
+        self.rng = np.random.default_rng(seed)
+
+    # demand of all stores for the next n_days (days x stores)
+    def draw(self, n_days):
+        return .5*np.ceil(self.rng.exponential(self.scale, (n_days, len(self.scale))))
+
+    # position of the stream (JSON serializable, see simulation.checkpoint)
+    @property
+    def state(self):
+        return self.rng.bit_generator.state
+
+    @state.setter
+    def state(self, state):
+        self.rng.bit_generator.state = state
+
+#=============
+# REPLAY MODEL
+
+# historical sales of each store, replayed day by day from arrays (days x stores)
+# that are summed (e.g. memory-mapped caches of several products, see load_sales)
+class replay_demand:
+    kind = 'replay'
+
+    def __init__(self, sales, chunk_days=30, cycle=False, products=()):
+        self.sales = list(sales)
+        # names of the products of the sales (e.g. sales_p1), see simulation.restore
+        self.products = tuple(products)
+        self.n_days = len(self.sales[0])
+        # days read from the sales at once
+        self.chunk_days = chunk_days
+        # start over at the first day at the end of the history (error otherwise)
+        self.cycle = cycle
+        # next day of the history
+        self.day = 0
+
+    # sales of all stores for the next n_days (days x stores)
+    def draw(self, n_days):
+        if not self.cycle and self.day + n_days > self.n_days:
+            raise ValueError('sales history ends after %d days' % self.n_days)
+        demand = np.zeros((n_days, self.sales[0].shape[1]))
+        # contiguous ranges of days of the history
+        row = 0
+        while row < n_days:
+            start = (self.day + row) % self.n_days
+            end = min(self.n_days, start + n_days - row)
+            for sales in self.sales:
+                demand[row:row+end-start] += sales[start:end]
+            row += end - start
+        self.day += n_days
+        return demand
+
+    # days left in the history (None: unlimited when cycling)
+    @property
+    def days_left(self):
+        return None if self.cycle else self.n_days - self.day
+
+    @property
+    def state(self):
+        return {'day': self.day}
+
+    @state.setter
+    def state(self, state):
+        self.day = state['day']
+
+# replay of the sales CSV files (summed) for a network with n_stores stores
+def historical_demand(csv_paths, n_stores, chunk_days=30, cycle=False):
+    sales = [load_sales(path) for path in csv_paths]
+    for path, product_sales in zip(csv_paths, sales):
+        if product_sales.shape != sales[0].shape:
+            raise ValueError('sales of %s do not cover the days of %s' % (path, csv_paths[0]))
+        if product_sales.shape[1] != n_stores:
+            raise ValueError('%s has sales of %d stores, the network has %d'
+                             % (path, product_sales.shape[1], n_stores))
+    products = [os.path.splitext(os.path.basename(path))[0] for path in csv_paths]
+    return replay_demand(sales, chunk_days, cycle, products)
+
+# independent random streams derived from a single seed (e.g. one per case)
+def spawn_seeds(seed, n_streams):
+    return np.random.SeedSequence(seed).spawn(n_streams)
+
+#=============
+# SALES CACHE
+
+# folder of the binary sales caches (None to parse the CSV files on every read)
+sales_cache_dir = 'sales_cache'
+# default sales of replay_demand (product 1, the product of the demand model)
+sales_files = (os.path.join(os.path.dirname(os.path.abspath(__file__)), 'viz_input', 'sales_p1.csv'),)
+
+# memory-mapped sales of a CSV file (days x stores), the cache is rebuilt
+# when the CSV file changes
+def load_sales(csv_path):
+    if sales_cache_dir is None:
+        return np.loadtxt(csv_path, delimiter=',', ndmin=2).T
+    info = os.stat(csv_path)
+    key = hashlib.sha1(repr((os.path.abspath(csv_path), info.st_size, info.st_mtime_ns)).encode()).hexdigest()
+    path = os.path.join(sales_cache_dir, os.path.splitext(os.path.basename(csv_path))[0]+'_'+key+'.npy')
+    if not os.path.exists(path):
+        build_sales_cache(csv_path, path)
+    return np.load(path, mmap_mode='r')
+
+# parse a sales CSV file (one row per store) line by line into a binary
+# array of days x stores, so a day of all stores is contiguous on disk
+def build_sales_cache(csv_path, path):
+    # size of the array (the file is read twice, never held in memory)
+    n_stores, n_days = 0, 0
+    with open(csv_path) as f:
+        for line in f:
+            if line.strip():
+                n_stores += 1
+                n_days = max(n_days, line.count(',')+1)
+    with atomic_write(path) as tmp_path:
+        sales = np.lib.format.open_memmap(tmp_path, 'w+', dtype='f4', shape=(n_days, n_stores))
+        with open(csv_path) as f:
+            store = 0
+            for line in f:
+                if line.strip():
+                    sales[:, store] = np.array(line.split(','), dtype='f4')
+                    store += 1
+        sales.flush()
+        del sales
+    return path
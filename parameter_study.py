@@ -18,14 +18,21 @@ COLLABORATORS
     N. Roy 
 """
 
+import os, time, copy
 import numpy as np
 from application import *
+from demand import spawn_seeds
+from replicas import replica_simulation
 
 #===================
 # DEFINE CASE CLASS
 
 class case:
-    def __init__(self,n_trucks,interval,base_cost,cost_per_mile,max_stores,min_percent, tag):
+    def __init__(self,n_trucks,interval,base_cost,cost_per_mile,max_stores,min_percent, tag,
+                 route_solver='held_karp', routing='lazy', seed=0, headless=False,
+                 scheduler='daily', truck_speed=None, demand='exponential', demand_files=None,
+                 route_construction='savings', route_time_budget=None, route_radius=None,
+                 route_neighbours=None, warning_policy='index'):
         self.n_trucks = n_trucks
         self.interval = interval
         self.base_cost = base_cost
@@ -33,6 +40,38 @@ class case:
         self.max_stores = max_stores
         self.min_percent = min_percent
         self.tag = tag
+        # optimal route solver ('held_karp' or 'brute_force', see routing.py)
+        self.route_solver = route_solver
+        # route computation ('lazy': on first request, 'table': all combinations upfront,
+        # 'heuristic': built for the stores of each dispatch, see routing.heuristic_router)
+        self.routing = routing
+        # construction of heuristic routes ('savings' or 'nearest_neighbour') and
+        # time budget of their improvement per dispatch in seconds (None: no limit;
+        # with a budget the routes depend on the speed and load of the machine,
+        # so seeded runs are no longer reproducible)
+        self.route_construction = route_construction
+        self.route_time_budget = route_time_budget
+        # pruning of the store combinations of a route: stores within route_radius
+        # (Manhattan distance) and/or among the route_neighbours nearest stores of
+        # each other and of a warehouse (None for both: all combinations)
+        self.route_radius = route_radius
+        self.route_neighbours = route_neighbours
+        # seed of the random demand (see demand.spawn_seeds for independent cases)
+        self.seed = seed
+        # skip figures of the run (results can be saved and rendered later)
+        self.headless = headless
+        # 'daily': all days are simulated, 'events': days without dispatch are fast-forwarded
+        self.scheduler = scheduler
+        # truck speed in miles per hour (None: trips end on the day of dispatch,
+        # requires the event scheduler otherwise)
+        self.truck_speed = truck_speed
+        # 'exponential': random demand of the model, 'replay': historical sales
+        # of demand_files summed (default viz_input/sales_p1.csv, see demand.py)
+        self.demand = demand
+        self.demand_files = demand_files
+        # order of the stores with stock warnings ('index': store order, 'zero_first':
+        # zero stock stores are routed first, trucks left over serve low stock stores)
+        self.warning_policy = warning_policy
 
 #==========
 # BASELINE
@@ -49,19 +88,53 @@ cost_per_mile = 10
 max_stores = 3
 # min percentage of stock before issuing warning
 min_percent = .8
+# route computation (full table is cached on disk, see routing.py)
+routing = 'table'
 
 # create baseline case
-baseline = case(n_trucks,interval,base_cost,cost_per_mile,max_stores,min_percent,'baseline')
-
-#====================
-# EXECUTE SIMULATION
-
-start = time.time()
-sim=simulation(baseline)
-sim.advance_time(90)
-end = time.time()
-
-print 'simulation took:',end-start
+baseline = case(n_trucks,interval,base_cost,cost_per_mile,max_stores,min_percent,'baseline',
+                routing=routing)
+
+#=================
+# SWEEP EXECUTION
+
+# execute a single case without figures and return its cumulative metrics,
+# the daily history is saved in results_dir for rendering on demand;
+# with a checkpoint the case is forked from the saved warm-up period
+def run_case(this_case, n_days=90, results_dir=None, checkpoint=None):
+    if checkpoint is None:
+        sim = simulation(this_case)
+    else:
+        sim = from_checkpoint(this_case, checkpoint)
+    sim.headless = True
+    sim.advance_time(n_days)
+    if results_dir is not None:
+        sim.save_results(os.path.join(results_dir, sim.prefix() +'_results.npz'))
+    return(sim.cum_revenue, sim.cum_delivery_cost, sim.cum_opp_cost, sim.cum_profit)
+
+# execute cases on a process pool, metrics are returned in case order;
+# a seed gives every case an independent demand stream derived from it
+# (cases forked from a checkpoint continue the demand stream of the snapshot),
+# the cases given are left unchanged
+def run_sweep(cases, n_days=90, max_workers=None, seed=None, results_dir=None, checkpoint=None):
+    from concurrent.futures import ProcessPoolExecutor
+    if seed is not None:
+        cases = [copy.copy(this_case) for this_case in cases]
+        for this_case, case_seed in zip(cases, spawn_seeds(seed, len(cases))):
+            this_case.seed = case_seed
+    with ProcessPoolExecutor(max_workers) as pool:
+        results = list(pool.map(run_case, cases, [n_days]*len(cases), [results_dir]*len(cases),
+                                [checkpoint]*len(cases)))
+    # cum_revenue, cum_delivery_cost, cum_opp_cost, cum_profit
+    return tuple(list(metric) for metric in zip(*results))
+
+# replicate a case with independent demand streams (all replicas are run
+# together, see replicas.py); returns mean, variance and quantiles of the
+# cumulative metrics
+def run_replicas(this_case, n_replicas=1000, n_days=90, seed=None, quantiles=(.05, .5, .95)):
+    replicas = replica_simulation(this_case, n_replicas, seed)
+    replicas.advance_time(n_days)
+    return(replicas.summary(quantiles))
 
 #==================
 # NUMBER OF TRUCKS
@@ -71,26 +144,16 @@ def study_trucks():
     # loop over variables
     for n_t in range(1,11):
         # define case
-        this_case = case(n_t, baseline.interval, baseline.base_cost, 
-                         baseline.cost_per_mile, baseline.max_stores,
-                         baseline.min_percent,'n_trucks')
-        # generate sim case
-        n_truck_cases.append(simulation(this_case))
-    
-    # loop over cases
-    for n_t in n_truck_cases:
-        # execute the sim case
-        n_t.advance_time(90)
-    
-    # get useful information for plotting
-    cum_revenue = [sim.cum_revenue for sim in n_truck_cases]
-    cum_del_cost = [sim.cum_delivery_cost  for sim in n_truck_cases]
-    cum_opp_cost =  [sim.cum_opp_cost for sim in n_truck_cases]
-    cum_profit =  [sim.cum_profit for sim in n_truck_cases]
-    
+        n_truck_cases.append(case(n_t, baseline.interval, baseline.base_cost,
+                                  baseline.cost_per_mile, baseline.max_stores,
+                                  baseline.min_percent,'n_trucks', routing=baseline.routing))
+
+    # execute the sim cases and get useful information for plotting
+    cum_revenue, cum_del_cost, cum_opp_cost, cum_profit = run_sweep(n_truck_cases)
+
     # activate interactive mode
     #plt.ion()
-    
+
     # generate plot
     n_trucks_finances_fig = plot_study_finances('# trucks', range(1,11), cum_revenue, cum_del_cost, cum_opp_cost)
     n_trucks_profit_fig = plot_study_profit('# trucks', range(1,11), cum_profit)
@@ -105,25 +168,15 @@ def study_maxstores():
     # loop over variables
     for n_ms in range(1,6):
         # define case
-        this_case = case(baseline.n_trucks, baseline.interval, baseline.base_cost,baseline.cost_per_mile, n_ms,
-                         baseline.min_percent,'max_stores')
-        # generate sim case
-        n_maxstore_cases.append(simulation(this_case))
-    
-    # loop over cases
-    for n_ms in n_maxstore_cases:
-        # execute the sim case
-        n_ms.advance_time(90)
-    
-    # get useful information for plotting
-    cum_revenue = [sim.cum_revenue for sim in n_maxstore_cases]
-    cum_del_cost = [sim.cum_delivery_cost  for sim in n_maxstore_cases]
-    cum_opp_cost =  [sim.cum_opp_cost for sim in n_maxstore_cases]
-    cum_profit =  [sim.cum_profit for sim in n_maxstore_cases]
-    
+        n_maxstore_cases.append(case(baseline.n_trucks, baseline.interval, baseline.base_cost,baseline.cost_per_mile, n_ms,
+                                     baseline.min_percent,'max_stores', routing=baseline.routing))
+
+    # execute the sim cases and get useful information for plotting
+    cum_revenue, cum_del_cost, cum_opp_cost, cum_profit = run_sweep(n_maxstore_cases)
+
     # activate interactive mode
     #plt.ion()
-    
+
     # generate plot
     n_maxstores_finances_fig = plot_study_finances('# maxstores', range(1,6), cum_revenue, cum_del_cost, cum_opp_cost)
     n_maxstores_profit_fig = plot_study_profit('# maxstores', range(1,6), cum_profit)
@@ -138,28 +191,30 @@ def study_min_percent():
     # loop over variables
     for min_p in np.linspace(0,.9,10):
         # define case
-        this_case = case(baseline.n_trucks, baseline.interval, baseline.base_cost, 
-                         baseline.cost_per_mile, baseline.max_stores,
-                         min_p,'min_percent')
-        # generate sim case
-        min_percent_cases.append(simulation(this_case))
-        
-    # loop over cases
-    for min_p in min_percent_cases:
-        # execute the sim case
-        min_p.advance_time(90)
-
-    # get useful information for plotting
-    cum_revenue = [sim.cum_revenue for sim in min_percent_cases]
-    cum_del_cost = [sim.cum_delivery_cost  for sim in min_percent_cases]
-    cum_opp_cost =  [sim.cum_opp_cost for sim in min_percent_cases]
-    cum_profit =  [sim.cum_profit for sim in min_percent_cases]
-  
+        min_percent_cases.append(case(baseline.n_trucks, baseline.interval, baseline.base_cost,
+                                      baseline.cost_per_mile, baseline.max_stores,
+                                      min_p,'min_percent', routing=baseline.routing))
+
+    # execute the sim cases and get useful information for plotting
+    cum_revenue, cum_del_cost, cum_opp_cost, cum_profit = run_sweep(min_percent_cases)
+
     # activate interactive mode
     #plt.ion()
-    
+
     # generate plot
     min_percent_finances_fig = plot_study_finances('min percent', np.linspace(0,.9,10), cum_revenue, cum_del_cost, cum_opp_cost)
     min_percent_profit_fig = plot_study_profit('min percent', np.linspace(0,.9,10), cum_profit)
     min_percent_finances_fig.savefig('study_min_percent_finances.png')
-    min_percent_profit_fig.savefig('study_min_percent_profit.png')
\ No newline at end of file
+    min_percent_profit_fig.savefig('study_min_percent_profit.png')
+
+#====================
+# EXECUTE SIMULATION
+
+if __name__ == '__main__':
+    print_network_info(load_default_network())
+    start = time.time()
+    sim=simulation(baseline)
+    sim.advance_time(90)
+    end = time.time()
+
+    print('simulation took:',end-start)
\ No newline at end of file
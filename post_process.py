@@ -16,9 +16,19 @@ COLLABORATORS
     N. Roy 
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+# matplotlib.pyplot is imported on first use (importing post_process does not
+# load matplotlib), figures are not shown interactively
+class lazy_pyplot:
+    def __getattr__(self, name):
+        import matplotlib.pyplot as pyplot
+        pyplot.ioff()
+        globals()['plt'] = pyplot
+        return getattr(pyplot, name)
+
+plt = lazy_pyplot()
+
 #============
 # PLOT COSTS
         
@@ -84,18 +94,19 @@ def plot_sales(daily_stock, daily_demand):
 #============
 # PLOT STOCK
 
-def plot_warehouse_stock(daily_stock_W1, daily_stock_W2):
+# daily_stock: (days x warehouses) stock, names: warehouse names
+def plot_warehouse_stock(daily_stock, names):
     # daily plot
     daily_fig, daily_ax = plt.subplots()
-    daily_ax.plot(range(len(daily_stock_W1)),daily_stock_W1, label='W1 stock')
-    daily_ax.plot(range(len(daily_stock_W2)),daily_stock_W2, label='W2 stock')
+    for index, name in enumerate(names):
+        daily_ax.plot(range(len(daily_stock)),daily_stock[:,index], label=str(name)+' stock')
     daily_ax.set_xlabel('days')
     daily_ax.set_ylabel('products')
     daily_ax.legend()
     # cumulative plot
     cum_fig, cum_ax = plt.subplots()
-    cum_ax.plot(range(len(daily_stock_W1)), np.cumsum(daily_stock_W1), label='W1 cum stock')
-    cum_ax.plot(range(len(daily_stock_W2)), np.cumsum(daily_stock_W2), label='W2 cum stock') 
+    for index, name in enumerate(names):
+        cum_ax.plot(range(len(daily_stock)), np.cumsum(daily_stock[:,index]), label=str(name)+' cum stock')
     daily_ax.set_xlabel('days')
     daily_ax.set_ylabel('products')
     cum_ax.legend()
@@ -142,4 +153,48 @@ def plot_study_profit(tag, variable, cum_profit):
     study_ax.set_xlabel(tag)
     study_ax.set_ylabel('dollar ($)')
     study_ax.legend()
-    return study_fig
\ No newline at end of file
+    return study_fig
+
+#================
+# RENDER RESULTS
+
+# plot and save all figures of a run (results as in simulation.results)
+def render_results(results, prefix):
+    # plot costs and save output
+    daily_fig, cum_fig = plot_costs(results['daily_opp_cost'], results['daily_delivery_cost'])
+    daily_fig.savefig(prefix +'_daily_costs.png')
+    cum_fig.savefig(prefix +'_cum_costs.png')
+
+    # plot revenue, total cost and profit
+    daily_fig, cum_fig = plot_finances(results['daily_revenue'], results['daily_delivery_cost'], results['daily_profit'])
+    daily_fig.savefig(prefix +'_daily_finances.png')
+    cum_fig.savefig(prefix +'_cum_finances.png')
+
+    # plot warehouse stock
+    daily_fig, cum_fig = plot_warehouse_stock(results['daily_warehouse_stock'], results['warehouse_names'])
+    daily_fig.savefig(prefix +'_daily_warehouse_stock.png')
+    cum_fig.savefig(prefix +'_cum_warehouse_stock.png')
+
+    # plot deliveries
+    daily_fig, cum_fig = plot_deliveries(results['daily_warehouse_deliveries'],
+                                         results['daily_store_deliveries'])
+    daily_fig.savefig(prefix +'_daily_deliveries.png')
+    cum_fig.savefig(prefix +'_cum_deliveries.png')
+
+    # close all figures
+    plt.close('all')
+
+# render results saved by simulation.save_results (prefix defaults to the run's)
+def render_file(path, prefix=None):
+    with np.load(path) as data:
+        results = dict(data)
+    if prefix is None:
+        prefix = str(results['prefix'])
+    render_results(results, prefix)
+    return prefix
+
+# render saved results of many runs in a pool of worker processes
+def render_files(paths, max_workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers) as pool:
+        return list(pool.map(render_file, paths))
\ No newline at end of file
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+PROFILER
+==============================================================================
+DESCRIPTION
+    This script implements the profiling of the event handlers of a
+    simulation (application.py). When attached, the handlers of the
+    simulation are replaced by timed wrappers that record for every handler:
+
+        calls        number of calls
+        time         cumulative wall time (includes nested handlers)
+        allocated    net memory allocated by the calls (memory=True only,
+                     uses tracemalloc, which slows down the run)
+        daily time   wall time of the calls of each day of the run
+
+    Detaching restores the handlers, so a simulation without profiler runs
+    without any overhead.
+
+CREATED
+    10/18/2026
+"""
+
+import json, time, tracemalloc
+import numpy as np
+
+# handlers of the simulation timed by default
+profiled_handlers = ('step', 'supply_chain', 'restock_warehouses', 'restock_stores',
+                     'optimal_routes', 'delivery_route', 'delivery_plan', 'delivery', 'store_iterator',
+                     'balance_sales', 'inventory_check', 'fast_forward', 'process_events',
+                     'render')
+
+#==========
+# PROFILER
+
+class handler_profiler:
+    def __init__(self, handlers=profiled_handlers, memory=False):
+        self.handlers = tuple(handlers)
+        self.memory = memory
+        self.calls = dict((name, 0) for name in self.handlers)
+        self.time = dict((name, 0.) for name in self.handlers)
+        self.allocated = dict((name, 0) for name in self.handlers)
+        # wall time of each handler per day of the run {day: time}
+        self.daily = dict((name, {}) for name in self.handlers)
+        self.sim = None
+        self.started_tracing = False
+
+    # replace the handlers of a simulation by timed wrappers
+    def attach(self, sim):
+        self.detach()
+        self.sim = sim
+        for name in self.handlers:
+            setattr(sim, name, self.wrap(name, getattr(sim, name)))
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    # restore the handlers of the simulation
+    def detach(self):
+        if self.sim is not None:
+            for name in self.handlers:
+                self.sim.__dict__.pop(name, None)
+            self.sim = None
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @property
+    def active(self):
+        return self.sim is not None
+
+    def wrap(self, name, handler):
+        sim = self.sim
+        def timed(*args, **kwargs):
+            if self.memory:
+                before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.calls[name] += 1
+                self.time[name] += elapsed
+                day = sim.recorder.days - 1
+                self.daily[name][day] = self.daily[name].get(day, 0.) + elapsed
+                if self.memory:
+                    self.allocated[name] += max(0, tracemalloc.get_traced_memory()[0] - before)
+        return timed
+
+    #=== REPORT
+    # one row per handler called, slowest first
+    def summary(self):
+        rows = []
+        for name in self.handlers:
+            if self.calls[name] > 0:
+                rows.append({'handler': name, 'calls': self.calls[name], 'time': self.time[name],
+                             'time_per_call': self.time[name] / self.calls[name],
+                             'allocated': self.allocated[name] if self.memory else None})
+        return sorted(rows, key=lambda row: -row['time'])
+
+    def table(self):
+        lines = ['%-20s %10s %12s %14s %14s' % ('handler', 'calls', 'time [s]', 'per call [ms]', 'allocated [kB]')]
+        for row in self.summary():
+            allocated = '%14.1f' % (row['allocated']/1e3) if row['allocated'] is not None else '%14s' % '-'
+            lines.append('%-20s %10d %12.4f %14.4f %s' % (row['handler'], row['calls'], row['time'],
+                                                          1e3*row['time_per_call'], allocated))
+        return '\n'.join(lines)
+
+    # wall time of a handler on every day of the run (0 on days without calls)
+    def day_times(self, name):
+        days = self.daily[name]
+        times = np.zeros(max(days) + 1 if days else 0)
+        for day, elapsed in days.items():
+            if day >= 0:
+                times[day] = elapsed
+        return times
+
+    # histogram of the daily wall times of a handler (days with calls only)
+    def histogram(self, name, bins=10):
+        return np.histogram(list(self.daily[name].values()), bins=bins)
+
+    # summary and daily times as JSON
+    def save(self, path):
+        report = {'summary': self.summary(),
+                  'daily': dict((name, self.day_times(name).tolist()) for name in self.handlers
+                                if self.calls[name] > 0)}
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=1)
+        return path
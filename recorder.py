@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+RECORDER
+==============================================================================
+DESCRIPTION
+    This script implements the recorder of the daily history of a simulation.
+    All days are kept in preallocated arrays:
+
+        daily                  (days,) structured array, one field per metric
+        warehouse_stock        (days x warehouses) stock at the end of logistics
+        store_sales            (days x stores) effective sales of each store
+        store_missed_sales     (days x stores) missed sales of each store
+
+    series() and the other accessors return views of the recorded days
+    (no copies), export_npz and export_parquet write them in bulk.
+
+CREATED
+    10/18/2026
+"""
+
+import numpy as np
+
+#=========
+# METRICS
+
+# daily metrics of the whole network
+metrics = ('demand', 'sales', 'revenue', 'opp_cost', 'deliveries',
+           'warehouse_deliveries', 'store_deliveries', 'mileage',
+           'delivery_cost', 'profit')
+
+#==========
+# RECORDER
+
+class metrics_recorder:
+    def __init__(self, warehouse_names, store_names, n_days=0):
+        self.warehouse_names = list(warehouse_names)
+        self.store_names = list(store_names)
+        # number of recorded days
+        self.days = 0
+        self.daily = np.zeros(n_days, dtype=[(name, 'f8') for name in metrics])
+        self.warehouse_stock = np.zeros((n_days, len(self.warehouse_names)))
+        self.store_sales = np.zeros((n_days, len(self.store_names)))
+        self.store_missed_sales = np.zeros((n_days, len(self.store_names)))
+
+    # make room for n_days more days (capacity at least doubles when growing)
+    def reserve(self, n_days):
+        needed = self.days + n_days
+        if needed <= len(self.daily):
+            return
+        size = max(needed, 2*len(self.daily))
+        for name in ('daily', 'warehouse_stock', 'store_sales', 'store_missed_sales'):
+            old = getattr(self, name)
+            new = np.zeros((size,)+old.shape[1:], dtype=old.dtype)
+            new[:self.days] = old[:self.days]
+            setattr(self, name, new)
+
+    # start a new day and return its row
+    def next_day(self):
+        self.reserve(1)
+        self.days += 1
+        return self.days - 1
+
+    # start n_days new days and return their rows (slice)
+    def next_days(self, n_days):
+        self.reserve(n_days)
+        self.days += n_days
+        return slice(self.days - n_days, self.days)
+
+    # record metrics of a day or of the rows of next_days (metric=value)
+    def record(self, row, **values):
+        for name, value in values.items():
+            self.daily[name][row] = value
+
+    #=== VIEWS
+    # daily values of a metric
+    def series(self, name):
+        return self.daily[name][:self.days]
+
+    def warehouse_block(self):
+        return self.warehouse_stock[:self.days]
+
+    def store_sales_block(self):
+        return self.store_sales[:self.days]
+
+    def store_missed_sales_block(self):
+        return self.store_missed_sales[:self.days]
+
+    # all recorded arrays by name (as saved by export_npz)
+    def columns(self):
+        columns = dict(('daily_'+name, self.series(name)) for name in metrics)
+        columns['daily_warehouse_stock'] = self.warehouse_block()
+        columns['daily_store_sales'] = self.store_sales_block()
+        columns['daily_store_missed_sales'] = self.store_missed_sales_block()
+        columns['warehouse_names'] = np.array(self.warehouse_names)
+        columns['store_names'] = np.array(self.store_names)
+        return columns
+
+    # continue from arrays saved by columns/export_npz (e.g. a checkpoint)
+    def restore(self, columns):
+        if list(columns['store_names']) != self.store_names or \
+           list(columns['warehouse_names']) != self.warehouse_names:
+            raise ValueError('recorded history belongs to a different network')
+        self.days = 0
+        n_days = len(columns['daily_'+metrics[0]])
+        self.reserve(n_days)
+        for name in metrics:
+            self.daily[name][:n_days] = columns['daily_'+name]
+        self.warehouse_stock[:n_days] = columns['daily_warehouse_stock']
+        self.store_sales[:n_days] = columns['daily_store_sales']
+        self.store_missed_sales[:n_days] = columns['daily_store_missed_sales']
+        self.days = n_days
+
+    #=== EXPORT
+    # all arrays in a single .npz file (extra arrays can be added by name)
+    def export_npz(self, path, **extra):
+        columns = self.columns()
+        columns.update(extra)
+        np.savez(path, **columns)
+        return path
+
+    # network metrics and warehouse stock as one table (a row per day), the
+    # sales of each store as a second table (a row per day and store)
+    def export_parquet(self, path, store_path=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('export_parquet requires pyarrow (pip install pyarrow)')
+        columns = {'day': np.arange(self.days)}
+        for name in metrics:
+            columns[name] = self.series(name)
+        for index, name in enumerate(self.warehouse_names):
+            columns['stock_'+name] = self.warehouse_block()[:,index]
+        pq.write_table(pa.table(columns), path)
+        if store_path is None:
+            store_path = path.rsplit('.parquet', 1)[0] + '_stores.parquet'
+        n_stores = len(self.store_names)
+        stores = {'day': np.repeat(np.arange(self.days), n_stores),
+                  'store': np.tile(np.array(self.store_names), self.days),
+                  'sales': self.store_sales_block().ravel(),
+                  'missed_sales': self.store_missed_sales_block().ravel()}
+        pq.write_table(pa.table(stores), store_path)
+        return path, store_path
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+REPLICAS
+==============================================================================
+DESCRIPTION
+    This script implements the Monte Carlo replication of a case. R replicas
+    with independent demand streams are advanced together and the state of
+    all replicas is kept in arrays with a replica dimension:
+
+        store_stock        (R x stores)
+        warehouse_stock    (R x warehouses)
+        on_hold            (R x trucks)
+        demand             (days x R x stores)
+
+    Every replica follows the rules of simulation (application.py): replica r
+    gives the same results as a simulation of the case with the seed
+    spawn_seeds(seed, R)[r]. Routes are chosen from the full route table of
+    the case (routing.py) and trips end on the day of dispatch: cases with
+    heuristic or pruned routes, replayed demand, truck_speed or the
+    'zero_first' warning_policy are rejected.
+
+CREATED
+    10/18/2026
+"""
+
+import numpy as np
+from topology import load_default_network, truck
+from itertools import combinations
+from routing import shared_route_table, binomials
+from demand import exponential_demand, spawn_seeds
+from recorder import metrics
+
+#==========
+# REPLICAS
+
+# store positions of route combinations gathered at once by best_routes
+block_size = 2**20
+
+class replica_simulation:
+    def __init__(self, case, n_replicas, seed=None, net=None):
+        #=== TOPOLOGY
+        if net is None:
+            net = load_default_network()
+        self.net = net.fresh()
+        self.n_replicas = n_replicas
+        stores, warehouses = self.net.store_state, self.net.warehouse_state
+        # stock of all replicas
+        self.store_stock = np.tile(stores.curr_stock, (n_replicas, 1))
+        self.warehouse_stock = np.tile(warehouses.curr_stock, (n_replicas, 1))
+        # restock targets and minimum stock
+        self.store_refill = stores.capacity * (stores.refill_pc / 100.0)
+        self.warehouse_refill = warehouses.capacity * (warehouses.refill_pc / 100.0)
+        self.store_min = np.floor(case.min_percent * stores.capacity)
+        self.warehouse_min = np.floor(case.min_percent * warehouses.capacity)
+        # stores with low or zero stock (see application.stock_warnings)
+        self.low = np.zeros(self.store_stock.shape, dtype=bool)
+        self.zero = np.zeros(self.store_stock.shape, dtype=bool)
+        #=== TRUCK DELIVERY SYSTEM
+        # routes are chosen from the full route table of the case
+        if case.routing == 'heuristic' or case.route_radius is not None or case.route_neighbours is not None:
+            raise ValueError('replicas require the exact routes of all store combinations')
+        # trucks deliver and are back on the day of dispatch
+        if case.truck_speed is not None:
+            raise ValueError('replicas do not model truck trips (truck_speed)')
+        # stores are routed together whatever their stock
+        if case.warning_policy != 'index':
+            raise ValueError('replicas serve the stores with warnings in store order (warning_policy)')
+        self.interval = case.interval
+        self.T = []
+        for t in range(case.n_trucks):
+            self.T.append(truck('T'+str(t+1),50, 0, (), 1, case.base_cost, case.cost_per_mile, case.max_stores))
+        self.on_hold = np.ones((n_replicas, len(self.T)), dtype=int)
+        # all routes of up to max_stores stores, as store and warehouse positions
+        table = shared_route_table([w.idx for w in self.net.W], [s.idx for s in self.net.S],
+                                   self.net.D, case.max_stores, case.route_solver)
+        first_store = len(self.net.P) + len(self.net.W)
+        self.route_dist = np.asarray(table.dist)
+        self.route_origin = np.asarray(table.origin) - len(self.net.P)
+        self.route_stores = np.where(table.order >= 0, table.order - first_store, -1)
+        # routes are sorted by size: rows of the routes with size stores
+        sizes = np.count_nonzero(self.route_stores >= 0, axis=1)
+        self.route_rows = dict((size, (np.searchsorted(sizes, size), np.searchsorted(sizes, size, 'right')))
+                               for size in range(1, case.max_stores+1))
+        # combinations of the warned stores are ranked in the routes of their size
+        self.binom = binomials(len(self.net.S), case.max_stores)
+        self.comb_cache = {}
+        #=== DEMAND
+        if case.demand != 'exponential':
+            raise ValueError('replicas require the random demand model')
+        if seed is None:
+            seed = case.seed
+        self.demand = [exponential_demand(stores.exp_sale, replica_seed)
+                       for replica_seed in spawn_seeds(seed, n_replicas)]
+        #=== HISTORY (days x replicas for every metric, see recorder.py)
+        self.price_per_unit = 100
+        self.history = dict((name, np.zeros((0, n_replicas))) for name in metrics)
+
+    # run all replicas for n_days
+    def advance_time(self, n_days):
+        # demand of all replicas (days x replicas x stores)
+        demand = np.stack([stream.draw(n_days) for stream in self.demand], axis=1)
+        block = dict((name, np.zeros((n_days, self.n_replicas))) for name in metrics)
+        for day in range(n_days):
+            #=== SUPPLY CHAIN
+            deliveries, warehouse_deliveries, store_deliveries, mileage, delivery_cost = self.supply_chain()
+            block['deliveries'][day] = deliveries
+            block['warehouse_deliveries'][day] = warehouse_deliveries
+            block['store_deliveries'][day] = store_deliveries
+            block['mileage'][day] = mileage
+            block['delivery_cost'][day] = delivery_cost
+            #=== STORES
+            eff_sales = np.minimum(demand[day], self.store_stock)
+            miss_sales = demand[day] - eff_sales
+            self.store_stock -= eff_sales
+            self.inventory_check()
+            block['demand'][day] = np.sum(demand[day], axis=1)
+            block['sales'][day] = np.sum(eff_sales, axis=1)
+            block['revenue'][day] = block['sales'][day] * self.price_per_unit
+            block['opp_cost'][day] = np.sum(miss_sales, axis=1) * self.price_per_unit
+            block['profit'][day] = block['revenue'][day] - delivery_cost
+        for name in metrics:
+            self.history[name] = np.concatenate((self.history[name], block[name]))
+        #=== SUMMARY OF FINANCES (one value per replica)
+        self.cum_demand = self.cumulative('demand')
+        self.cum_sales = self.cumulative('sales')
+        self.cum_revenue = self.cumulative('revenue')
+        self.cum_opp_cost = self.cumulative('opp_cost')
+        self.cum_profit = self.cumulative('profit')
+        self.cum_delivery_cost = self.cumulative('delivery_cost')
+
+    # sum of a metric over all days (replicas,), summed in the same order as
+    # the daily series of a simulation
+    def cumulative(self, name):
+        return np.sum(np.ascontiguousarray(self.history[name].T), axis=1)
+
+    #=== STATISTICS
+    # mean, variance and quantiles of the cumulative metrics over the replicas
+    def summary(self, quantiles=(.05, .5, .95)):
+        stats = {}
+        for name in metrics:
+            stats['cum_'+name] = self.statistics(self.cumulative(name), quantiles)
+        return(stats)
+
+    # mean, variance and quantiles of the metrics of every day (arrays over days)
+    def daily_summary(self, quantiles=(.05, .5, .95)):
+        stats = {}
+        for name in metrics:
+            stats['daily_'+name] = self.statistics(self.history[name].T, quantiles)
+        return(stats)
+
+    # statistics over the replicas (first axis)
+    def statistics(self, values, quantiles):
+        return {'mean': np.mean(values, axis=0),
+                'var': np.var(values, axis=0, ddof=1 if self.n_replicas > 1 else 0),
+                'quantiles': dict(zip(quantiles, np.quantile(values, quantiles, axis=0)))}
+
+#================
+# EVENT HANDLERS
+
+    # check if stock is low and issue warning (all replicas and stores at once)
+    def inventory_check(self):
+        low_stock = self.store_stock <= self.store_min
+        self.zero |= low_stock & (self.store_stock == 0)
+        self.low |= low_stock & (self.store_stock > 0)
+        self.low &= ~self.zero
+
+    # logistics of the day of all replicas (see simulation.supply_chain)
+    def supply_chain(self):
+        # trucks dispatched today
+        busy = np.zeros(self.on_hold.shape, dtype=bool)
+        w_del, w_miles, w_del_cost = self.restock_warehouses(busy)
+        s_del, s_miles, s_del_cost = self.restock_stores(busy)
+        return(w_del + s_del, w_del, s_del, w_miles + s_miles, w_del_cost + s_del_cost)
+
+    # restock warehouses (see simulation.restock_warehouses)
+    def restock_warehouses(self, busy):
+        n_trips, mileage, delivery_cost = (np.zeros(self.n_replicas) for i in range(3))
+        for t, this_truck in enumerate(self.T):
+            ready = self.on_hold[:, t] >= self.interval
+            for w, warehouse in enumerate(self.net.W):
+                go = ready & (self.warehouse_stock[:, w] <= self.warehouse_min[w])
+                if not go.any():
+                    continue
+                self.on_hold[go, t] = 1
+                busy[go, t] = True
+                path_dist = 2.*self.net.D[warehouse.idx, warehouse.parent.idx]
+                order = self.warehouse_refill[w] - self.warehouse_stock[go, w]
+                actual_load = np.where(order > this_truck.capacity, this_truck.capacity, order)
+                mileage[go] += path_dist
+                delivery_cost[go] += mileage[go] * this_truck.cost_per_mile
+                n_trips[go] += 1
+                self.warehouse_stock[go, w] += actual_load
+            self.on_hold[~ready, t] += 1
+        return(n_trips, mileage, delivery_cost)
+
+    # restock stores (see simulation.restock_stores, trucks are routed over
+    # disjoint combinations of the stores with warnings of the day)
+    def restock_stores(self, busy):
+        n_trips, mileage, delivery_cost = (np.zeros(self.n_replicas) for i in range(3))
+        # stores routed today
+        routed = np.zeros(self.store_stock.shape, dtype=bool)
+        for t, this_truck in enumerate(self.T):
+            warned = (self.low | self.zero) & ~routed
+            n_warned = np.count_nonzero(warned, axis=1)
+            self.on_hold[(n_warned == 0) & ~busy[:, t], t] += 1
+            go = np.flatnonzero((n_warned > 0) & (self.on_hold[:, t] >= self.interval) & ~busy[:, t])
+            if len(go) == 0:
+                continue
+            self.on_hold[go, t] = 1
+            rows = self.best_routes(warned[go], np.minimum(n_warned[go], this_truck.max_stores))
+            route_dist = self.route_dist[rows]
+            route_stores = self.route_stores[rows]
+            # compile order for stores
+            order = np.zeros(len(go))
+            for stop in route_stores.T:
+                on_route = stop >= 0
+                order[on_route] += self.store_refill[stop[on_route]] - self.store_stock[go[on_route], stop[on_route]]
+            actual_load = np.where(order > this_truck.capacity, this_truck.capacity, order)
+            mileage[go] += route_dist
+            delivery_cost[go] += route_dist * this_truck.cost_per_mile
+            n_trips[go] += 1
+            # perform delivery
+            self.warehouse_stock[go, self.route_origin[rows]] -= actual_load
+            for stop in route_stores.T:
+                on_route = stop >= 0
+                replica, store, load = go[on_route], stop[on_route], actual_load[on_route]
+                routed[replica, store] = True
+                order = self.store_refill[store] - self.store_stock[replica, store]
+                actual_restock = np.where(load >= order, order, load)
+                self.store_stock[replica, store] += actual_restock
+                actual_load[on_route] -= actual_restock
+                # update warnings
+                stocked = self.store_stock[replica, store] >= self.store_min[store]
+                partial = ~stocked & (self.store_stock[replica, store] > 0)
+                self.low[replica[stocked], store[stocked]] = False
+                self.zero[replica[stocked], store[stocked]] = False
+                self.low[replica[partial], store[partial]] = True
+                self.zero[replica[partial], store[partial]] = False
+        return(n_trips, mileage, delivery_cost)
+
+    # row of the shortest route over comb_size of the warned stores of each
+    # replica (ties keep the first combination, see routing.best_route): the
+    # combinations of the warned stores are ranked in the route table, for
+    # the replicas with the same number of warned stores at once
+    def best_routes(self, warned, comb_size):
+        rows = np.zeros(len(warned), dtype=int)
+        n_warned = np.count_nonzero(warned, axis=1)
+        for n, size in set(zip(n_warned.tolist(), comb_size.tolist())):
+            group = np.flatnonzero((n_warned == n) & (comb_size == size))
+            combs = self.combinations(n, size)
+            # replicas of a block (bounds the memory of their combinations)
+            step = max(1, block_size // combs.size)
+            for first in range(0, len(group), step):
+                replicas = group[first:first+step]
+                # positions of the stores of every combination (replicas x combinations x size)
+                stores = np.nonzero(warned[replicas])[1].reshape(len(replicas), n)[:, combs]
+                comb_rows = self.route_rows[size][0] + self.comb_rank(stores)
+                shortest = np.argmin(self.route_dist[comb_rows], axis=1)
+                rows[replicas] = comb_rows[np.arange(len(replicas)), shortest]
+        return(rows)
+
+    # combinations of size of range(n) in the order of itertools.combinations
+    def combinations(self, n, size):
+        if (n, size) not in self.comb_cache:
+            self.comb_cache[n, size] = np.array(list(combinations(range(n), size)), dtype=int).reshape(-1, size)
+        return self.comb_cache[n, size]
+
+    # position of combinations of store positions (sorted, last axis) among
+    # the combinations of their size in itertools order
+    def comb_rank(self, combs):
+        n, size = len(self.net.S), combs.shape[-1]
+        # weight of the i-th store of a combination at each position
+        weights = self.binom[n - 1 - np.arange(n)]
+        rank = np.full(combs.shape[:-1], self.binom[n, size] - 1)
+        for i in range(size):
+            rank -= np.take(weights[:, size - i], combs[..., i])
+        return rank
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+ROAD NETWORK
+==============================================================================
+DESCRIPTION
+    This script implements sparse road networks between the entities of the
+    simulation. Roads are segments between intersections, given as grid
+    streets or read from an edge-list file with one road per line:
+
+        x1,y1,x2,y2,length      (length is optional, straight line otherwise)
+
+    Entities join the road network at their nearest intersection. The
+    shortest paths between all entities are computed once with
+    scipy.sparse.csgraph and kept as a dense matrix over the entities only
+    (indexed by entity.idx, see topology.network), cached on disk in
+    road_cache_dir:
+
+        roads = grid_roads(13, 7)                   streets every km
+        roads = load_roads('roads.csv')
+        net = network('store_info.csv', roads=roads)
+
+CREATED
+    10/18/2026
+"""
+
+import os, hashlib
+import numpy as np
+from storage import atomic_write
+
+#=======
+# ROADS
+
+# sparse road network: intersections (x, y) and roads between them
+class road_network:
+    def __init__(self, coords, edges, lengths=None):
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        edges = np.asarray(edges, dtype=int).reshape(-1, 2)
+        if lengths is None:
+            lengths = np.hypot(*(self.coords[edges[:,0]] - self.coords[edges[:,1]]).T)
+        lengths = np.asarray(lengths, dtype=float)
+        # roads are two-way, parallel roads keep the shortest one
+        edges = np.sort(edges, axis=1)
+        order = np.lexsort((lengths, edges[:,1], edges[:,0]))
+        edges, lengths = edges[order], lengths[order]
+        first = np.ones(len(edges), dtype=bool)
+        first[1:] = np.any(edges[1:] != edges[:-1], axis=1)
+        self.edges = edges[first & (edges[:,0] != edges[:,1])]
+        self.lengths = lengths[first & (edges[:,0] != edges[:,1])]
+
+    # sparse adjacency matrix of the roads (lengths as weights)
+    def csgraph(self):
+        from scipy.sparse import csr_matrix
+        n = len(self.coords)
+        return csr_matrix((self.lengths, (self.edges[:,0], self.edges[:,1])), shape=(n, n))
+
+    # nearest intersection of each point (Manhattan distance) and the
+    # distance to reach it
+    def access(self, points):
+        from scipy.spatial import cKDTree
+        dist, nearest = cKDTree(self.coords).query(np.asarray(points, dtype=float).reshape(-1, 2), p=1)
+        return nearest, dist
+
+    # shortest path distances between all points (dense, points x points),
+    # from a single source Dijkstra of each access intersection, in chunks
+    # of sources to bound the memory of the intermediate rows
+    def distances(self, points, chunk=256):
+        from scipy.sparse.csgraph import dijkstra
+        nearest, access = self.access(points)
+        sources, inverse = np.unique(nearest, return_inverse=True)
+        graph = self.csgraph()
+        between = np.empty((len(sources), len(sources)))
+        for start in range(0, len(sources), chunk):
+            rows = dijkstra(graph, directed=False, indices=sources[start:start+chunk])
+            between[start:start+chunk] = rows[:, sources]
+        D = between[np.ix_(inverse, inverse)] + access[:,None] + access[None,:]
+        np.fill_diagonal(D, 0.)
+        if np.isinf(D).any():
+            raise ValueError('points not connected by the road network')
+        return D
+
+    # key of the roads and points of a distance matrix
+    def key(self, points):
+        digest = hashlib.sha1(self.coords.tobytes())
+        digest.update(self.edges.tobytes())
+        digest.update(self.lengths.tobytes())
+        digest.update(np.ascontiguousarray(points, dtype=float).tobytes())
+        return digest.hexdigest()
+
+    # distances between the points, computed once and loaded from road_cache_dir
+    def distance_matrix(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if road_cache_dir is None:
+            return self.distances(points)
+        path = os.path.join(road_cache_dir, 'distances_'+self.key(points)+'.npy')
+        if os.path.exists(path):
+            return np.load(path)
+        D = self.distances(points)
+        with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as f:
+            np.save(f, D)
+        return D
+
+#===========
+# GENERATORS
+
+# grid streets every spacing km over width x height km (origin at 0, 0)
+def grid_roads(width, height, spacing=1.):
+    nx, ny = int(round(width/spacing))+1, int(round(height/spacing))+1
+    x, y = np.meshgrid(np.arange(nx)*spacing, np.arange(ny)*spacing, indexing='ij')
+    coords = np.column_stack((x.ravel(), y.ravel()))
+    index = np.arange(nx*ny).reshape(nx, ny)
+    edges = np.vstack((np.column_stack((index[:-1,:].ravel(), index[1:,:].ravel())),
+                       np.column_stack((index[:,:-1].ravel(), index[:,1:].ravel()))))
+    return road_network(coords, edges, np.full(len(edges), float(spacing)))
+
+# roads of an edge-list file (x1,y1,x2,y2[,length] per line, optional header)
+def load_roads(path):
+    with open(path) as f:
+        header = f.readline()
+    skip = 0 if header.split(',')[0].strip().lstrip('-').replace('.', '', 1).isdigit() else 1
+    rows = np.loadtxt(path, delimiter=',', skiprows=skip, ndmin=2)
+    ends = rows[:, :4].reshape(-1, 2)
+    coords, inverse = np.unique(ends, axis=0, return_inverse=True)
+    edges = inverse.reshape(-1, 2)
+    return road_network(coords, edges, rows[:, 4] if rows.shape[1] > 4 else None)
+
+#=======
+# CACHE
+
+# folder of the distance matrices on disk (None to disable)
+road_cache_dir = 'road_cache'
@@ -0,0 +1,714 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+ROUTING
+==============================================================================
+DESCRIPTION
+    This script implements the solvers for the optimal delivery routes. A
+    route leaves a warehouse, visits a combination of stores and returns to
+    the same warehouse. Every solver takes the entity ids of the warehouses
+    and stores, computes the shortest route for all combinations of up to
+    max_stores stores and returns them as arrays:
+
+        dist    (n_routes,)              length of the shortest route
+        origin  (n_routes,)              entity id of the warehouse
+        order   (n_routes, max_stores)   entity ids of the stores in visiting
+                                         order, padded with -1
+
+    Routes are sorted by combination size and then by combination, in the
+    order given by itertools.combinations(stores, size). When several routes
+    have the same length (up to rtol) the first warehouse and the
+    lexicographically smallest visiting order win, so all solvers return
+    identical routes.
+
+    For many stores with warnings or large max_stores, heuristic_router
+    builds routes for the stores of each dispatch only (nearest neighbour
+    or Clarke-Wright savings construction, 2-opt and Or-opt improvement,
+    optionally within a time budget that trades reproducibility for
+    speed); route_gap measures its excess length over the
+    exact routes. A store_neighbourhood (KD-tree over the coordinates)
+    prunes the combinations of stores of both to stores close to each other
+    and to a warehouse.
+
+CREATED
+    10/18/2026
+"""
+
+import os, time, hashlib
+import numpy as np
+from storage import atomic_write
+from collections import OrderedDict
+from itertools import permutations, combinations
+
+# relative tolerance when comparing route lengths
+rtol = 1e-9
+
+#=============
+# BRUTE FORCE
+
+# evaluates every permutation of every combination (reference solver)
+def brute_force_routes(warehouses, stores, D, max_stores):
+    dist, origin, order = [], [], []
+    for comb_size in range(1, max_stores+1):
+        for comb in combinations(stores, comb_size):
+            # all tours warehouse/[stores]/warehouse
+            perm = np.array(list(permutations(comb, comb_size)))
+            tours = np.vstack([np.hstack((np.full((len(perm),1), warehouse), perm,
+                                          np.full((len(perm),1), warehouse)))
+                               for warehouse in warehouses])
+            path_dist = D[tours[:,:-1], tours[:,1:]].sum(axis=1)
+            # first shortest tour
+            shortest_dist = path_dist.min()
+            index = np.argmax(path_dist <= shortest_dist + rtol*max(shortest_dist, 1.))
+            best = (shortest_dist, tours[index,0], tours[index,1:-1])
+            dist.append(best[0])
+            origin.append(best[1])
+            order.append(np.concatenate((best[2], [-1]*(max_stores-comb_size))))
+    return (np.array(dist, dtype=float), np.array(origin, dtype=int),
+            np.array(order, dtype=int).reshape(-1, max_stores))
+
+#============
+# HELD-KARP
+
+# binomial coefficients, binom[n,k] = C(n,k)
+def binomials(n, k):
+    binom = np.zeros((n+1, k+1), dtype=np.int64)
+    binom[:,0] = 1
+    for i in range(1, n+1):
+        binom[i,1:] = binom[i-1,1:] + binom[i-1,:-1]
+    return binom
+
+# combinations of range(n) for each size up to k, in colexicographic order
+def colex_combinations(n, k, binom):
+    combs = {1: np.arange(n).reshape(-1,1)}
+    for size in range(2, k+1):
+        # combinations with largest element m extend the ones of range(m)
+        blocks = [np.hstack((combs[size-1][:binom[m,size-1]],
+                             np.full((binom[m,size-1],1), m)))
+                  for m in range(size-1, n)]
+        combs[size] = np.vstack(blocks) if blocks else np.empty((0,size), dtype=int)
+    return combs
+
+# position of (sorted) combinations in colexicographic order
+def colex_rank(combs, binom):
+    rank = np.zeros(len(combs), dtype=np.int64)
+    for i in range(combs.shape[1]):
+        rank += binom[combs[:,i], i+1]
+    return rank
+
+# shortest paths warehouse -> all stores of a combination -> last store
+def held_karp_paths(D_ws, D_ss, max_stores, binom, combs):
+    # paths[size][w, rank, j]: path from warehouse w visiting the combination
+    # with that rank and ending at its j-th store
+    paths = {1: D_ws[:,:,None].copy()}
+    for size in range(2, max_stores+1):
+        comb = combs[size]
+        paths[size] = np.empty((len(D_ws), len(comb), size))
+        for j in range(size):
+            # extend the shortest sub-paths over the remaining stores
+            rest = np.delete(comb, j, axis=1)
+            sub_paths = paths[size-1][:, colex_rank(rest, binom), :]
+            legs = D_ss[rest, comb[:,j:j+1]]
+            paths[size][:,:,j] = (sub_paths + legs[None,:,:]).min(axis=2)
+    return paths
+
+# shortest route for each combination of a given size
+def held_karp_tours(D_ws, D_ss, size, binom, combs, paths):
+    comb = combs[size]
+    n_comb = len(comb)
+    rows = np.arange(n_comb)
+    # close the paths back to the warehouse
+    tours = (paths[size] + D_ws[:, comb]).min(axis=2)
+    dist = tours.min(axis=0)
+    tol = rtol*np.maximum(dist, 1.)
+    # first warehouse with the shortest route
+    w = np.argmax(tours <= dist + tol, axis=0)
+    # rebuild the lexicographically smallest visiting order
+    order = np.empty((n_comb, size), dtype=int)
+    remaining = np.ones((n_comb, size), dtype=bool)
+    travelled = np.zeros(n_comb)
+    current = None
+    for step in range(size):
+        left = size - step
+        rest = comb[remaining].reshape(n_comb, left)
+        # shortest completion: next store -> remaining stores -> warehouse
+        completion = paths[left][w[:,None], colex_rank(rest, binom)[:,None], np.arange(left)]
+        if current is None:
+            legs = D_ws[w[:,None], rest]
+        else:
+            legs = D_ss[current[:,None], rest]
+        index = np.argmax(travelled[:,None] + legs + completion <= (dist + tol)[:,None], axis=1)
+        current = rest[rows, index]
+        order[:, step] = current
+        travelled += legs[rows, index]
+        remaining[rows, np.argmax(np.cumsum(remaining, axis=1) == index[:,None]+1, axis=1)] = False
+    return dist, w, order
+
+# subset dynamic programming, sub-paths are shared by all combinations
+def held_karp_routes(warehouses, stores, D, max_stores):
+    w_idx = np.asarray(warehouses, dtype=int)
+    s_idx = np.asarray(stores, dtype=int)
+    width, max_stores = max_stores, min(max_stores, len(stores))
+    D_ws = D[np.ix_(w_idx, s_idx)]
+    D_ss = D[np.ix_(s_idx, s_idx)]
+    binom = binomials(len(stores), max_stores)
+    combs = colex_combinations(len(stores), max_stores, binom)
+    paths = held_karp_paths(D_ws, D_ss, max_stores, binom, combs)
+    dist, origin, order = [], [], []
+    for size in range(1, max_stores+1):
+        size_dist, w, size_order = held_karp_tours(D_ws, D_ss, size, binom, combs, paths)
+        # sort combinations in the order of itertools.combinations
+        lex = np.lexsort(combs[size].T[::-1])
+        dist.append(size_dist[lex])
+        origin.append(w_idx[w[lex]])
+        order.append(np.hstack((s_idx[size_order[lex]],
+                                np.full((len(lex), width-size), -1))))
+    return (np.concatenate(dist), np.concatenate(origin),
+            np.vstack(order).reshape(-1, width))
+
+#=======
+# INDEX
+
+# bitmask key of a combination of entity ids
+def subset_key(idx):
+    key = 0
+    for i in idx:
+        key |= 1 << int(i)
+    return key
+
+# bitmask keys of the store combinations in an order array, as big-endian
+# 64-bit words (most significant first) viewed as one byte string per row,
+# so the byte order of the keys is the order of the bitmasks (n_words
+# words, default: enough for the largest id)
+def subset_keys(order, n_words=None):
+    order = np.asarray(order)
+    if n_words is None:
+        n_words = max(int(order.max()) if order.size else 0, 0) // 64 + 1
+    words = np.zeros((len(order), n_words), dtype=np.uint64)
+    rows, columns = np.nonzero(order >= 0)
+    ids = order[rows, columns]
+    np.bitwise_or.at(words, (rows, n_words - 1 - (ids >> 6)), np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64)))
+    return words.astype('>u8').view('V%d' % (8*n_words)).reshape(len(order))
+
+# shortest route over any comb_size of the given stores, where
+# lookup(comb) returns the route over exactly comb (or None); with a
+# neighbourhood only its combinations are considered, and smaller ones when
+# it has none of comb_size stores; a store listed several times counts once
+def best_route(lookup, stores, comb_size, neighbourhood=None):
+    stores = sorted(set(stores))
+    combs = combinations if neighbourhood is None else neighbourhood.combinations
+    shortest = None
+    for size in range(min(comb_size, len(stores)), 0, -1):
+        # combinations are generated lazily, ties keep the first combination
+        for comb in combs(stores, size):
+            route = lookup(comb)
+            if route is not None and (shortest is None or route[0] < shortest[0]):
+                shortest = route
+        if shortest is not None:
+            break
+    return shortest
+
+# shortest routes over disjoint comb_size combinations of the given stores
+# for up to n_routes trucks, as chosen by dispatching the trucks one after
+# the other on the stores not yet routed: the routes of all combinations are
+# looked up once and taken shortest first (ties keep the first combination),
+# stores left over share routes of fewer stores; lookups(combs) returns the
+# routes over exactly each comb (or None)
+def plan_routes(lookups, stores, comb_size, n_routes, neighbourhood=None):
+    left = sorted(set(stores))
+    combs = combinations if neighbourhood is None else neighbourhood.combinations
+    plan = []
+    size = min(comb_size, len(left))
+    # without neighbourhood the first pass leaves fewer than size stores,
+    # the second one routes all of them together
+    while left and len(plan) < n_routes:
+        sizes = list(combs(left, size))
+        routes = lookups(sizes)
+        routed = 0
+        for i in sorted((i for i in range(len(routes)) if routes[i] is not None), key=lambda i: routes[i][0]):
+            key = subset_key(sizes[i])
+            if key & routed == 0:
+                plan.append(routes[i])
+                routed |= key
+                if len(plan) == n_routes:
+                    break
+        left = [store for store in left if not routed >> store & 1]
+        size = min(size - 1, len(left))
+    return plan
+
+# optimal routes indexed by the bitmask of their stores: every combination
+# of stores has a single (shortest) route, found by binary search over the
+# keys of the rows (see subset_keys), given with the rows that sort them
+# when loaded from disk (see save_routes)
+class route_index:
+    def __init__(self, dist, origin, order, keys=None, sorter=None):
+        self.dist = dist
+        self.origin = origin
+        self.order = order
+        if keys is None:
+            keys = subset_keys(np.asarray(order))
+        if sorter is None:
+            sorter = np.argsort(keys, kind='stable')
+        self.keys = keys
+        self.sorter = sorter
+
+    # route warehouse/[stores]/warehouse as entity ids
+    def route(self, row):
+        stores = tuple(idx for idx in self.order[row].tolist() if idx >= 0)
+        origin = int(self.origin[row])
+        return (origin,)+stores+(origin,)
+
+    # rows of the routes over exactly each combination of stores (-1 if not
+    # indexed), one binary search over the keys for all of them
+    def rows(self, combs):
+        rows = np.full(len(combs), -1)
+        if len(combs) == 0 or len(self.keys) == 0:
+            return rows
+        order = np.array(combs, dtype=int).reshape(len(combs), -1)
+        n_words = self.keys.dtype.itemsize // 8
+        # stores beyond the ids of the table are not indexed
+        valid = np.all(order < 64*n_words, axis=1)
+        keys = subset_keys(order[valid], n_words)
+        pos = np.searchsorted(self.keys, keys, sorter=self.sorter)
+        found = np.asarray(self.sorter)[np.minimum(pos, len(self.keys)-1)]
+        rows[valid] = np.where(self.keys[found] == keys, found, -1)
+        return rows
+
+    # shortest routes over exactly each combination of stores (None if not indexed)
+    def lookups(self, combs):
+        return [None if row < 0 else (float(self.dist[row]), self.route(row)) for row in self.rows(combs).tolist()]
+
+    # row of the route over exactly the given stores (-1 if not indexed)
+    def row(self, stores):
+        size = self.keys.dtype.itemsize
+        key = subset_key(stores)
+        if key >> 8*size or len(self.keys) == 0:
+            return -1
+        key = key.to_bytes(size, 'big')
+        pos = int(np.searchsorted(self.keys, np.frombuffer(key, dtype=self.keys.dtype), sorter=self.sorter)[0])
+        if pos == len(self.keys) or self.keys[self.sorter[pos]].tobytes() != key:
+            return -1
+        return int(self.sorter[pos])
+
+    # shortest route over exactly the given stores (None if not indexed)
+    def lookup(self, stores):
+        row = self.row(stores)
+        if row < 0:
+            return None
+        return (float(self.dist[row]), self.route(row))
+
+    # shortest route over any comb_size of the given stores
+    def best_route(self, stores, comb_size, neighbourhood=None):
+        return best_route(self.lookup, stores, comb_size, neighbourhood)
+
+    # routes of up to n_routes trucks over disjoint combinations of the stores
+    def plan(self, stores, comb_size, n_routes, neighbourhood=None):
+        return plan_routes(self.lookups, stores, comb_size, n_routes, neighbourhood)
+
+#=========
+# SOLVERS
+
+route_solvers = {'brute_force': brute_force_routes,
+                 'held_karp': held_karp_routes}
+
+# shortest route over exactly the given stores
+def shortest_route(solver, warehouses, stores, D):
+    dist, origin, order = route_solvers[solver](warehouses, sorted(stores), D, len(stores))
+    # the full combination is the last one
+    return (float(dist[-1]), (int(origin[-1]),)+tuple(order[-1].tolist())+(int(origin[-1]),))
+
+#=======
+# CACHE
+
+# maximum number of store combinations kept by a route cache
+cache_size = 100000
+
+# shortest routes computed on first request and kept in least recently used order
+class route_cache:
+    def __init__(self, warehouses, D, solver='held_karp', max_size=cache_size):
+        self.warehouses = warehouses
+        self.D = D
+        self.solver = solver
+        self.max_size = max_size
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # shortest route over exactly the given stores
+    def lookup(self, stores):
+        key = subset_key(stores)
+        route = self.routes.pop(key, None)
+        if route is None:
+            self.misses += 1
+            route = shortest_route(self.solver, self.warehouses, stores, self.D)
+            # evict least recently used route
+            if len(self.routes) >= self.max_size:
+                self.routes.popitem(last=False)
+        else:
+            self.hits += 1
+        # (re)insert as most recently used
+        self.routes[key] = route
+        return route
+
+    # shortest routes over exactly each combination of stores
+    def lookups(self, combs):
+        return [self.lookup(comb) for comb in combs]
+
+    # shortest route over any comb_size of the given stores
+    def best_route(self, stores, comb_size, neighbourhood=None):
+        return best_route(self.lookup, stores, comb_size, neighbourhood)
+
+    # routes of up to n_routes trucks over disjoint combinations of the stores
+    def plan(self, stores, comb_size, n_routes, neighbourhood=None):
+        return plan_routes(self.lookups, stores, comb_size, n_routes, neighbourhood)
+
+#===========
+# HEURISTIC
+
+# length of the route warehouse/[stores]/warehouse
+def tour_length(origin, stores, D):
+    tour = [origin]+list(stores)+[origin]
+    return float(D[tour[:-1], tour[1:]].sum())
+
+# nearest neighbour path over the stores starting at the first one (up to
+# length stores, neighbours of each other with a neighbourhood)
+def nearest_neighbour_path(stores, D, length=None, neighbourhood=None):
+    path, left = [stores[0]], list(stores[1:])
+    areas = -1
+    while length is None or len(path) < length:
+        if neighbourhood is not None:
+            areas &= neighbourhood.area.get(path[-1], 0)
+            left = neighbourhood.extensions(path[-1], areas, left)
+        if not left:
+            break
+        nearest = int(np.argmin(D[path[-1], left]))
+        path.append(left.pop(nearest))
+    return path
+
+# Clarke-Wright savings routes of up to max_stores stores from a warehouse
+# (of neighbours of each other only with a neighbourhood)
+def savings_routes(origin, stores, D, max_stores, neighbourhood=None):
+    route_of = dict((store, [store]) for store in stores)
+    if len(stores) > 1 and max_stores > 1:
+        idx = np.asarray(stores)
+        # saving of joining two stores in a route instead of two routes
+        if neighbourhood is None:
+            first, second = np.triu_indices(len(idx), 1)
+        else:
+            first, second = neighbourhood.pairs(stores)
+        saving = D[origin, idx[first]] + D[origin, idx[second]] - D[idx[first], idx[second]]
+        # largest savings first (savings are never negative for distances
+        # with the triangle inequality, so routes are joined up to max_stores)
+        for k in np.argsort(-saving, kind='stable'):
+            a, b = stores[first[k]], stores[second[k]]
+            route_a, route_b = route_of[a], route_of[b]
+            if route_a is route_b or len(route_a) + len(route_b) > max_stores:
+                continue
+            if neighbourhood is not None and not neighbourhood.compatible(route_a, route_b):
+                continue
+            # a and b must be at the ends of their routes, joined as ...a-b...
+            if route_a[-1] != a:
+                if route_a[0] != a:
+                    continue
+                route_a.reverse()
+            if route_b[0] != b:
+                if route_b[-1] != b:
+                    continue
+                route_b.reverse()
+            route = route_a + route_b
+            for store in route:
+                route_of[store] = route
+    routes, seen = [], set()
+    for store in stores:
+        if id(route_of[store]) not in seen:
+            seen.add(id(route_of[store]))
+            routes.append(route_of[store])
+    return routes
+
+# reverse the sections of a tour that shorten it (2-opt), in place
+def two_opt_pass(tour, D):
+    improved = False
+    for i in range(1, len(tour)-2):
+        for j in range(i+1, len(tour)-1):
+            delta = (D[tour[i-1], tour[j]] + D[tour[i], tour[j+1]]
+                     - D[tour[i-1], tour[i]] - D[tour[j], tour[j+1]])
+            if delta < -rtol:
+                tour[i:j+1] = tour[i:j+1][::-1]
+                improved = True
+    return improved
+
+# first move of up to 3 consecutive stores to another place of the tour
+# that shortens it (Or-opt), None if there is none
+def or_opt_move(tour, D):
+    for length in (1, 2, 3):
+        for i in range(1, len(tour)-length):
+            segment = tour[i:i+length]
+            rest = tour[:i] + tour[i+length:]
+            removed = (D[tour[i-1], tour[i]] + D[tour[i+length-1], tour[i+length]]
+                       - D[tour[i-1], tour[i+length]])
+            for j in range(1, len(rest)):
+                if j == i:
+                    continue
+                for piece in (segment, segment[::-1]):
+                    added = D[rest[j-1], piece[0]] + D[piece[-1], rest[j]] - D[rest[j-1], rest[j]]
+                    if added - removed < -rtol:
+                        return rest[:j] + piece + rest[j:]
+    return None
+
+# 2-opt and Or-opt moves on a route until no move shortens it or the
+# deadline (time.perf_counter) is passed, returns the visiting order
+def improve_route(origin, stores, D, deadline=None):
+    tour = [origin]+list(stores)+[origin]
+    improved = len(stores) > 2
+    while improved and (deadline is None or time.perf_counter() < deadline):
+        improved = two_opt_pass(tour, D)
+        moved = or_opt_move(tour, D)
+        if moved is not None:
+            tour = moved
+            improved = True
+    return [int(store) for store in tour[1:-1]]
+
+# routes built on request for the stores with warnings, for many stores or
+# large max_stores where the exact routes of all combinations are out of
+# reach ('nearest_neighbour' or 'savings' construction, improved with 2-opt
+# and Or-opt moves within time_budget seconds per request, None: no limit)
+class heuristic_router:
+    def __init__(self, warehouses, D, construction='savings', time_budget=None):
+        if construction not in ('nearest_neighbour', 'savings'):
+            raise ValueError('unknown route construction: '+str(construction))
+        self.warehouses = [int(w) for w in warehouses]
+        self.D = D
+        self.construction = construction
+        self.time_budget = time_budget
+
+    # shortest improved route over the stores from any warehouse (dist, route)
+    def close_route(self, stores, deadline):
+        best = None
+        for origin in self.warehouses:
+            dist = tour_length(origin, stores, self.D)
+            if best is None or dist < best[0] - rtol*max(best[0], 1.):
+                best = (dist, origin)
+        order = improve_route(best[1], stores, self.D, deadline)
+        return (tour_length(best[1], order, self.D), (best[1],)+tuple(order)+(best[1],))
+
+    # routes over disjoint sets of comb_size stores (fewer for the last ones)
+    def candidate_routes(self, stores, comb_size, deadline, neighbourhood=None):
+        if self.construction == 'savings':
+            # stores are served from their nearest warehouse
+            nearest = np.argmin(self.D[np.ix_(self.warehouses, stores)], axis=0)
+            groups = [[s for s, w in zip(stores, nearest) if w == index]
+                      for index in range(len(self.warehouses))]
+            return [self.close_route(route, deadline)
+                    for index, group in enumerate(groups) if group
+                    for route in savings_routes(self.warehouses[index], group, self.D, comb_size, neighbourhood)]
+        # nearest neighbour path of comb_size stores from every store
+        routes = []
+        for seed in stores:
+            path = nearest_neighbour_path([seed]+[s for s in stores if s != seed], self.D, comb_size, neighbourhood)
+            routes.append(self.close_route(path, deadline))
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        return routes
+
+    # routes of up to n_routes trucks over disjoint combinations of the stores
+    # (see plan_routes): routes of comb_size stores are taken shortest first
+    def plan(self, stores, comb_size, n_routes, neighbourhood=None):
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        left = sorted(set(int(store) for store in stores))
+        plan = []
+        while left and len(plan) < n_routes:
+            size = min(comb_size, len(left))
+            routes = self.candidate_routes(left, size, deadline, neighbourhood)
+            routed = set()
+            for dist, route in sorted(routes, key=lambda item: (len(item[1]) != size+2, item[0])):
+                if len(plan) == n_routes:
+                    break
+                if routed.isdisjoint(route[1:-1]):
+                    plan.append((dist, route))
+                    routed.update(route[1:-1])
+            left = [store for store in left if store not in routed]
+        return plan
+
+    # shortest route over comb_size of the given stores
+    def best_route(self, stores, comb_size, neighbourhood=None):
+        plan = self.plan(stores, comb_size, 1, neighbourhood)
+        return plan[0] if plan else None
+
+# gap of the heuristic routes against the exact ones: relative excess length
+# of the best route over comb_size stores of random sets of n_warned stores
+# ('route') and of the route over the stores of the exact route ('tour')
+def route_gap(router, warehouses, stores, D, comb_size, n_warned, n_samples=100, seed=0,
+              solver='held_karp'):
+    rng = np.random.default_rng(seed)
+    exact = route_cache(warehouses, D, solver)
+    route, tour = np.zeros(n_samples), np.zeros(n_samples)
+    for sample in range(n_samples):
+        warned = sorted(rng.choice(stores, n_warned, replace=False).tolist())
+        exact_dist, exact_route = exact.best_route(warned, comb_size)
+        route[sample] = router.best_route(warned, comb_size)[0] / exact_dist - 1.
+        tour_dist = router.close_route(list(exact_route[1:-1]), None)[0]
+        tour[sample] = tour_dist / exact_dist - 1.
+    return {'route': route, 'tour': tour}
+
+#=================
+# SPATIAL PRUNING
+
+# stores close to each other and to the warehouses, from a KD-tree over the
+# coordinates of the entities (Manhattan distance): two stores are
+# neighbours if they are within radius of each other and/or one is among
+# the k nearest stores of the other, the area of a warehouse holds the
+# stores within radius and/or its k nearest stores; combinations of stores
+# are pruned to neighbours of each other in a common area (single stores
+# are always allowed, so every store can be served)
+class store_neighbourhood:
+    def __init__(self, coords, warehouses, stores, radius=None, k=None):
+        from scipy.spatial import cKDTree
+        if radius is None and k is None:
+            raise ValueError('store neighbourhood requires a radius or k')
+        coords = np.asarray(coords, dtype=float)
+        self.stores = [int(store) for store in stores]
+        self.radius = radius
+        self.k = k
+        n = len(self.stores)
+        tree = cKDTree(coords[self.stores])
+        #=== NEIGHBOURS
+        pairs = None
+        if radius is not None:
+            pairs = tree.query_pairs(radius, p=1)
+        if k is not None:
+            nearest = tree.query(coords[self.stores], min(k+1, n), p=1)[1].reshape(n, -1)
+            k_pairs = set((min(i, j), max(i, j)) for i, row in enumerate(nearest.tolist())
+                          for j in row if j != i)
+            pairs = k_pairs if pairs is None else pairs & k_pairs
+        self.near = dict((store, set()) for store in self.stores)
+        for i, j in pairs:
+            self.near[self.stores[i]].add(self.stores[j])
+            self.near[self.stores[j]].add(self.stores[i])
+        #=== AREAS (bitmask of the warehouses of each store)
+        self.area = dict((store, 0) for store in self.stores)
+        for index, warehouse in enumerate(warehouses):
+            members = None
+            if radius is not None:
+                members = set(tree.query_ball_point(coords[warehouse], radius, p=1))
+            if k is not None:
+                k_members = set(np.atleast_1d(tree.query(coords[warehouse], min(k, n), p=1)[1]).tolist())
+                members = k_members if members is None else members & k_members
+            for i in members:
+                self.area[self.stores[i]] |= 1 << index
+
+    # stores of a combination can be extended with candidates that are
+    # neighbours of its last store and share an area with all of them
+    def extensions(self, store, areas, candidates):
+        near = self.near.get(store, ())
+        return [other for other in candidates if other in near and areas & self.area.get(other, 0)]
+
+    # combinations of size stores of neighbours in a common area, in the
+    # order of itertools.combinations
+    def combinations(self, stores, size):
+        stores = sorted(stores)
+        if size == 1:
+            for store in stores:
+                yield (store,)
+            return
+        def extend(comb, areas, candidates):
+            if len(comb) == size:
+                yield tuple(comb)
+                return
+            for i, store in enumerate(candidates):
+                common = areas & self.area.get(store, 0)
+                if common:
+                    yield from extend(comb+[store], common, self.extensions(store, common, candidates[i+1:]))
+        yield from extend([], -1, stores)
+
+    # pairs (i < j) of positions in stores of neighbours in a common area
+    def pairs(self, stores):
+        position = dict((store, i) for i, store in enumerate(stores))
+        pairs = sorted((i, position[other]) for i, store in enumerate(stores)
+                       for other in self.extensions(store, self.area.get(store, 0), self.near.get(store, ()))
+                       if position.get(other, -1) > i)
+        return np.array(pairs, dtype=int).reshape(-1, 2).T
+
+    # stores of a route can be joined with the stores of another one
+    def compatible(self, route_a, route_b):
+        areas = -1
+        for store in route_a + route_b:
+            areas &= self.area.get(store, 0)
+        return bool(areas) and all(b in self.near.get(a, ()) for a in route_a for b in route_b)
+
+#=================
+# SHARED ROUTING
+
+# route caches and tables shared by all simulations on the same topology
+# (least recently used first, at most shared_size of each are kept alive,
+# simulations keep the ones they use)
+route_caches = OrderedDict()
+route_tables = OrderedDict()
+shared_size = 4
+
+# entry of a shared registry, built on first request and kept in least
+# recently used order
+def shared_entry(registry, key, build):
+    entry = registry.pop(key, None)
+    if entry is None:
+        entry = build()
+        # drop least recently used entries
+        while len(registry) >= shared_size:
+            registry.popitem(last=False)
+    registry[key] = entry
+    return entry
+
+# identifies a topology by its warehouses (and stores) and the distances
+# between all entities, which follow from the entity coordinates
+def topology_key(entities, D, *params):
+    digest = hashlib.sha1(np.asarray(entities, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(D, dtype=float).tobytes())
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
+
+# lazy route cache for a topology
+def shared_route_cache(warehouses, D, solver='held_karp'):
+    key = topology_key(warehouses, D, solver)
+    return shared_entry(route_caches, key, lambda: route_cache(warehouses, D, solver))
+
+# eager route table for a topology, persisted in route_cache_dir
+def shared_route_table(warehouses, stores, D, max_stores, solver='held_karp'):
+    key = topology_key(list(warehouses)+list(stores), D, solver, max_stores, route_file_version)
+    def build():
+        path = None
+        if route_cache_dir is not None:
+            path = os.path.join(route_cache_dir, 'routes_'+key+'.npy')
+        if path is not None and os.path.exists(path):
+            return load_routes(path)
+        table = route_index(*route_solvers[solver](warehouses, stores, D, max_stores))
+        if path is not None:
+            save_routes(path, table)
+        return table
+    return shared_entry(route_tables, key, build)
+
+#============
+# DISK CACHE
+
+# folder of the route tables on disk (None to disable)
+route_cache_dir = 'route_cache'
+# changing the file layout invalidates all tables on disk
+route_file_version = 2
+
+# write the routes and keys of a route index as a single structured array
+# (sorter: rows of the keys in increasing order)
+def save_routes(path, index):
+    table = np.empty(len(index.dist), dtype=[('dist', 'f8'), ('origin', 'i4'),
+                                             ('order', 'i4', (index.order.shape[1],)),
+                                             ('key', index.keys.dtype), ('sorter', 'i8')])
+    table['dist'] = index.dist
+    table['origin'] = index.origin
+    table['order'] = index.order
+    table['key'] = index.keys
+    table['sorter'] = index.sorter
+    with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as f:
+        np.save(f, table)
+
+# memory-map route table written by save_routes
+def load_routes(path):
+    # plain array view of the mapped file (rows are read without memmap overhead)
+    table = np.load(path, mmap_mode='r').view(np.ndarray)
+    return route_index(table['dist'], table['origin'], table['order'], table['key'], table['sorter'])
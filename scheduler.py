@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+SCHEDULER
+==============================================================================
+DESCRIPTION
+    This script implements the event queue of the event driven simulation
+    (simulation with scheduler='events', see application.py). Times are in
+    days from the start of the run, fractions of a day are hours of travel:
+
+        event      (time, kind, data), data is a tuple of entity ids
+
+    Events with the same time are processed in the order they were pushed.
+    The stock of the stores between two events is advanced in a single
+    step (project_stock) instead of day by day.
+
+CREATED
+    10/18/2026
+"""
+
+import heapq
+import numpy as np
+
+#=============
+# EVENT QUEUE
+
+class event_queue:
+    def __init__(self):
+        self.heap = []
+        # push counter, breaks ties between events of the same time
+        self.seq = 0
+
+    def push(self, time, kind, *data):
+        heapq.heappush(self.heap, (time, self.seq, kind, data))
+        self.seq += 1
+
+    # remove and return the next event as (time, kind, data)
+    def pop(self):
+        time, seq, kind, data = heapq.heappop(self.heap)
+        return time, kind, data
+
+    # time of the next event (inf if empty)
+    def next_time(self):
+        if self.heap:
+            return self.heap[0][0]
+        return np.inf
+
+    # remove and return all events before time, in order
+    def pop_until(self, time):
+        while self.heap and self.heap[0][0] < time:
+            yield self.pop()
+
+    def __len__(self):
+        return len(self.heap)
+
+    #=== SNAPSHOTS
+    # pending events as a list of [time, kind, data] (JSON friendly)
+    def dump(self):
+        return [[time, kind, list(data)] for time, seq, kind, data in sorted(self.heap)]
+
+    # replace pending events with a list saved by dump
+    def load(self, events):
+        self.heap = []
+        self.seq = 0
+        for time, kind, data in events:
+            self.push(time, kind, *data)
+
+#===============
+# FAST FORWARD
+
+# stock after each day of demand (days x stores) when nothing is restocked,
+# sales are limited by the stock; same floating point operations as
+# subtracting the sales day by day
+def project_stock(stock, demand):
+    stock = np.subtract.accumulate(np.vstack((stock, demand)), axis=0)
+    return np.maximum(stock[1:], 0)
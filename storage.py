@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+STORAGE
+==============================================================================
+DESCRIPTION
+    This script implements the writing of the files shared between runs and
+    processes (route tables, sales caches, road distances). A file is written
+    under a temporary name in its folder and moved into place once complete,
+    so another process never reads it half written:
+
+        with atomic_write(path) as tmp_path, open(tmp_path, 'wb') as f:
+            np.save(f, array)
+
+CREATED
+    10/18/2026
+"""
+
+import os
+from contextlib import contextmanager
+
+# temporary path of a file (folder created if missing), renamed to path at
+# the end of the block or removed if the block fails
+@contextmanager
+def atomic_write(path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp_path = path+'.'+str(os.getpid())+'.tmp'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+==============================================================================
+SYNTHETIC NETWORKS
+==============================================================================
+DESCRIPTION
+    This script generates reproducible networks of any size for scale tests:
+    N stores, K warehouses and M plants on a grid with integer coordinates.
+    Store capacities and demand coefficients are drawn from the stores of
+    store_info.csv (the coefficient is about 3.2/capacity there), warehouses
+    are spread over the grid and supplied by their nearest plant.
+
+        synthetic_network(1000, 4, 2)               network ready for simulation
+        write_store_info('stores.csv', store_info)  same format as store_info.csv
+
+    The plants and warehouses are not part of store_info.csv, their specs
+    are passed to topology.network (see synthetic_specs).
+
+CREATED
+    10/18/2026
+"""
+
+import os
+import numpy as np
+from topology import network, plant_spec, warehouse_spec, min_percent
+from roads import grid_roads
+
+#===========
+# REFERENCE
+
+# store_info.csv of the package (independent of the working directory)
+reference_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'store_info.csv')
+
+# stores of store_info.csv: capacities and capacity x demand coefficient
+def reference_stores():
+    store_info = np.loadtxt(reference_file, delimiter=",", skiprows=1, ndmin=2)
+    return store_info[:,3], store_info[:,3] * store_info[:,4]
+
+# grid of store_info.csv (width x height) and its number of stores
+reference_grid = (13, 7)
+reference_n_stores = 20
+# warehouse capacity per store supplied (650 for 10 stores in warehouse_spec)
+warehouse_capacity_per_store = warehouse_spec[0][3] / 10.
+
+#===========
+# GENERATOR
+
+# default grid: same density of stores as store_info.csv
+def default_grid(n_stores):
+    scale = np.sqrt(n_stores / float(reference_n_stores))
+    return (max(1, int(round(reference_grid[0]*scale))), max(1, int(round(reference_grid[1]*scale))))
+
+# store rows (id, x, y, capacity, exp_sales_coeff) and plant and warehouse
+# specs of a random network (see topology.plant_spec/warehouse_spec)
+def synthetic_specs(n_stores, n_warehouses=2, n_plants=2, grid=None, seed=0):
+    rng = np.random.default_rng(seed)
+    if grid is None:
+        grid = default_grid(n_stores)
+    width, height = grid
+    #=== STORES
+    # distinct cells of the grid while there are enough of them
+    cells = rng.choice(width*height, n_stores, replace=n_stores > width*height)
+    reference_capacity, reference_demand = reference_stores()
+    capacity = rng.choice(reference_capacity, n_stores)
+    coeff = np.round(rng.choice(reference_demand, n_stores) / capacity, 2)
+    store_info = np.column_stack((np.arange(1, n_stores+1), cells % width, cells // width,
+                                  capacity, np.maximum(coeff, .01)))
+    #=== PLANTS
+    plant_cells = rng.choice(width*height, n_plants, replace=n_plants > width*height)
+    plants = [('P'+str(p+1), float(cell % width), float(cell // width), plant_spec[0][3], plant_spec[0][4])
+              for p, cell in enumerate(plant_cells)]
+    #=== WAREHOUSES
+    # centers of a layout of cols x rows tiles of the grid, nearest plant as parent
+    cols = int(np.ceil(np.sqrt(n_warehouses * width / float(height))))
+    rows = int(np.ceil(n_warehouses / float(cols)))
+    capacity = int(round(warehouse_capacity_per_store * n_stores / n_warehouses))
+    warehouses = []
+    for w in range(n_warehouses):
+        x = float(int((w % cols + .5) * width / cols))
+        y = float(int((w // cols + .5) * height / rows))
+        parent = min(plants, key=lambda plant: abs(plant[1]-x) + abs(plant[2]-y))
+        warehouses.append(('W'+str(w+1), x, y, capacity, warehouse_spec[0][4], parent[0]))
+    return store_info, plants, warehouses
+
+# network of random stores, warehouses and plants (roads: road network or
+# 'grid' for streets every km over the grid, see roads.py)
+def synthetic_network(n_stores, n_warehouses=2, n_plants=2, grid=None, seed=0, min_percent=min_percent,
+                      roads=None):
+    store_info, plants, warehouses = synthetic_specs(n_stores, n_warehouses, n_plants, grid, seed)
+    if isinstance(roads, str) and roads == 'grid':
+        width, height = grid if grid is not None else default_grid(n_stores)
+        roads = grid_roads(width-1, height-1)
+    return network(store_info, plants, warehouses, min_percent, roads)
+
+#========
+# OUTPUT
+
+# write store rows in the format of store_info.csv
+def write_store_info(path, store_info):
+    np.savetxt(path, store_info, delimiter=',', header='id,x,y,capacity,exp_sales_coeff',
+               comments='', fmt=['%d', '%d', '%d', '%d', '%.2f'])
+    return path
@@ -24,15 +24,17 @@ COLLABORATORS
 
 
 #import modules
-import sys, os
+import sys, os, copy
 from math import *
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
 
 #===========
 # I/O PATHS
-input_path = ''
+# folder of store_info.csv (next to this module, the working directory
+# when topology is imported if the file is not there)
+input_path = os.path.dirname(os.path.abspath(__file__))
+if not os.path.exists(os.path.join(input_path, 'store_info.csv')):
+    input_path = os.getcwd()
 
 #=========================
 # MISCELLANEOUS FUNCTIONS
@@ -41,9 +43,54 @@ input_path = ''
 def one_norm(A,B):
     return (abs(A.x-B.x)+abs(A.y-B.y))
 
+# manhattan distance between all entities (indexed by entity.idx)
+def distance_matrix(entities):
+    x = np.array([entity.x for entity in entities], dtype=float)
+    y = np.array([entity.y for entity in entities], dtype=float)
+    D = np.abs(x[:,None] - x[None,:])
+    D += np.abs(y[:,None] - y[None,:])
+    return D
+
+#=======
+# STATE
+
+# attribute of an entity kept in the state vectors of its group once bound
+class state_field:
+    def __init__(self, name):
+        self.name = name
+    def __get__(self, entity, owner):
+        if entity is None:
+            return self
+        if entity.state is None:
+            return entity.__dict__[self.name]
+        return getattr(entity.state, self.name)[entity.pos]
+    def __set__(self, entity, value):
+        if entity.state is None:
+            entity.__dict__[self.name] = value
+        else:
+            getattr(entity.state, self.name)[entity.pos] = value
+
+# storage state of a group of entities (stores or warehouses) as vectors
+class stock_state:
+    fields = ('curr_stock', 'capacity', 'min_stock', 'refill_pc', 'exp_sale')
+    def __init__(self, entities):
+        for name in self.fields:
+            setattr(self, name, np.array([getattr(entity, name, 0.) for entity in entities], dtype=float))
+        # entities read and write their attributes from the vectors
+        for pos, entity in enumerate(entities):
+            entity.pos = pos
+            entity.state = self
+
 #==========
 # ENTITIES
 class store:
+    # storage state (vectors shared by all stores)
+    state = None
+    curr_stock = state_field('curr_stock')
+    capacity = state_field('capacity')
+    min_stock = state_field('min_stock')
+    refill_pc = state_field('refill_pc')
+    exp_sale = state_field('exp_sale')
     def __init__(self,id, x, y, capacity, min_stock, refill_pc, exp_sale):
         # identification        
         self.id=id
@@ -55,13 +102,16 @@ class store:
         self.curr_stock=capacity
         self.min_stock=min_stock
         self.refill_pc=refill_pc
-        # effective and missed sales
-        self.eff_sales = []
-        self.miss_sales = []
         # data model: sales exp. distribution parameter
         self.exp_sale=exp_sale
 
 class warehouse:
+    # storage state (vectors shared by all warehouses)
+    state = None
+    curr_stock = state_field('curr_stock')
+    capacity = state_field('capacity')
+    min_stock = state_field('min_stock')
+    refill_pc = state_field('refill_pc')
     def __init__(self,id, x, y, capacity, min_stock,refill_pc,parent):
         # identification        
         self.id=id
@@ -114,20 +164,18 @@ class truck:
 #=========
 # NETWORK
 
-G=nx.Graph()
-
 #=== NODES
 
 # minimum percentage of capacity
 min_percent = .0
 
-# plants
-P = [plant('P1',1.0,4.0,10000,100),
-     plant('P2',6.0,1.0,10000,100)]
+# plants (id, x, y, capacity, production rate)
+plant_spec = [('P1',1.0,4.0,10000,100),
+              ('P2',6.0,1.0,10000,100)]
 
-# warehouses
-W = [warehouse('W1',4.0,3.0,650,int(min_percent*650),100,P[0]),
-     warehouse('W2',9.0,2.0,650,int(min_percent*650),100,P[1])]
+# warehouses (id, x, y, capacity, refill percentage, parent plant id)
+warehouse_spec = [('W1',4.0,3.0,650,100,'P1'),
+                  ('W2',9.0,2.0,650,100,'P2')]
 
 """
 REMOVED <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
@@ -137,47 +185,132 @@ REMOVED <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
 <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
 """
 
-
-# get store info (id,x,y,capacity,exp_sales_coefficient)
-store_info = np.loadtxt(os.path.join(input_path,'store_info.csv'),delimiter=",",skiprows=1)
-
-# stores
-S=[]
-
-for index in range(np.shape(store_info)[0]):#range(0,10):
-    S.append(store('S'+str(int(store_info[index,0])),
-             store_info[index,1],
-             store_info[index,2],
-             int(store_info[index,3]), 
-             int(store_info[index,3]*min_percent),
-             100,
-             store_info[index,4]))
-
-# add all nodes to graph
-for entity in P+W+S:
-    G.add_node((entity.x,entity.y))
-
-#=== EDGES
-
-# path from plant to warehouse
-G.add_edge((W[0].x,W[0].y),(W[0].parent.x,W[0].parent.y),length=one_norm(W[0].parent,W[0]))
-G.add_edge((W[1].x,W[1].y),(W[1].parent.x,W[1].parent.y),length=one_norm(W[1].parent,W[1]))
-
-
-# paths between stores and warehouses
-W_n_S = W+S
-for index in range(len(W_n_S)):
-    for neighbor_index in range(index+1,len(W_n_S)):
-        G.add_edge((W_n_S[index].x, W_n_S[index].y),(W_n_S[neighbor_index].x,W_n_S[neighbor_index].y),length=one_norm(W_n_S[index],W_n_S[neighbor_index]))
+# network of plants, warehouses and stores; the entities and their storage
+# state belong to one network, fresh() copies it for an independent simulation
+class network:
+    # store_file: store_info.csv file or its rows as an array (see synthetic.py)
+    # roads: sparse road network (see roads.py, None: straight Manhattan paths)
+    def __init__(self, store_file, plants=plant_spec, warehouses=warehouse_spec, min_percent=min_percent,
+                 roads=None):
+        # get store info (id,x,y,capacity,exp_sales_coefficient)
+        if isinstance(store_file, str):
+            self.store_info = np.loadtxt(store_file,delimiter=",",skiprows=1,ndmin=2)
+        else:
+            self.store_info = np.array(store_file, dtype=float, ndmin=2)
+        self.plant_spec = plants
+        self.warehouse_spec = warehouses
+        self.min_percent = min_percent
+        self.roads = roads
+        # entities in their initial state
+        self.build_entities()
+        # distances between all entities (shortest paths on the roads)
+        if roads is None:
+            self.D = distance_matrix(self.nodes)
+        else:
+            self.D = roads.distance_matrix([(entity.x, entity.y) for entity in self.nodes])
+        # graph view of the network used for plotting (built on first use)
+        self.graph = None
+
+    @property
+    def G(self):
+        if self.graph is None:
+            self.graph = self.build_graph()
+        return self.graph
+
+    # create entities and their storage state from the network input
+    def build_entities(self):
+        # plants
+        self.P = [plant(*spec) for spec in self.plant_spec]
+        parents = dict((entity.id, entity) for entity in self.P)
+        # warehouses
+        self.W = [warehouse(id, x, y, capacity, int(self.min_percent*capacity), refill_pc, parents[parent])
+                  for id, x, y, capacity, refill_pc, parent in self.warehouse_spec]
+        # stores
+        self.S = []
+        for index in range(np.shape(self.store_info)[0]):
+            self.S.append(store('S'+str(int(self.store_info[index,0])),
+                          self.store_info[index,1],
+                          self.store_info[index,2],
+                          int(self.store_info[index,3]),
+                          int(self.store_info[index,3]*self.min_percent),
+                          100,
+                          self.store_info[index,4]))
+        # storage state of stores and warehouses
+        self.store_state = stock_state(self.S)
+        self.warehouse_state = stock_state(self.W)
+        # all entities, position in list is the integer id used by the distance matrix
+        self.nodes = self.P+self.W+self.S
+        for idx, entity in enumerate(self.nodes):
+            entity.idx = idx
+        # entities by id
+        self.by_id = dict((entity.id, entity) for entity in self.nodes)
+
+    # graph with paths plant/warehouse and between all warehouses and stores
+    # (or the roads and the access of the entities to them)
+    def build_graph(self):
+        import networkx as nx
+        if self.roads is not None:
+            return self.build_road_graph()
+        G=nx.Graph()
+        # add all nodes to graph
+        for entity in self.nodes:
+            G.add_node((entity.x,entity.y))
+        # path from plant to warehouse
+        for entity in self.W:
+            G.add_edge((entity.x,entity.y),(entity.parent.x,entity.parent.y),length=one_norm(entity.parent,entity))
+        # paths between stores and warehouses
+        W_n_S = self.W+self.S
+        for index in range(len(W_n_S)):
+            for neighbor_index in range(index+1,len(W_n_S)):
+                G.add_edge((W_n_S[index].x, W_n_S[index].y),(W_n_S[neighbor_index].x,W_n_S[neighbor_index].y),length=one_norm(W_n_S[index],W_n_S[neighbor_index]))
+        return G
+
+    # graph of the roads, entities are joined to their nearest intersection
+    def build_road_graph(self):
+        import networkx as nx
+        G = nx.Graph()
+        coords = [tuple(xy) for xy in self.roads.coords.tolist()]
+        G.add_nodes_from(coords)
+        G.add_edges_from((coords[a], coords[b], {'length': length})
+                         for (a, b), length in zip(self.roads.edges.tolist(), self.roads.lengths.tolist()))
+        nearest, access = self.roads.access([(entity.x, entity.y) for entity in self.nodes])
+        for entity, node, length in zip(self.nodes, nearest.tolist(), access.tolist()):
+            G.add_node((entity.x, entity.y))
+            if length > 0:
+                G.add_edge((entity.x, entity.y), coords[node], length=length)
+        return G
+
+    # copy of the network in its initial state: input, distances and graph
+    # are shared, entities and storage state are new
+    def fresh(self):
+        clone = copy.copy(self)
+        clone.build_entities()
+        return clone
+
+#=================
+# DEFAULT NETWORK
+
+# network of the store_info.csv file (read on first use)
+default_network = None
+
+def load_default_network():
+    global default_network
+    if default_network is None:
+        default_network = network(os.path.join(input_path,'store_info.csv'))
+    return default_network
 
 #=============
 # OUTPUT INFO
 
 # print graph info
-print('The network contains:',G.number_of_nodes(),'nodes and ',G.number_of_edges(),' edges')
+def print_network_info(net):
+    print('The network contains:',net.G.number_of_nodes(),'nodes and ',net.G.number_of_edges(),' edges')
+
+if __name__ == '__main__':
+    print_network_info(load_default_network())
 
-# plot the graph
-# pos = nx.spring_layout(G)
-# nx.draw(G, pos)
-# nx.draw_networkx_edge_labels(G, pos)
-#plt.show()
+    # plot the graph
+    # pos = nx.spring_layout(G)
+    # nx.draw(G, pos)
+    # nx.draw_networkx_edge_labels(G, pos)
+    #plt.show()
\ No newline at end of file
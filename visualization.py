@@ -4,9 +4,17 @@
 INTERACTIVE VISUALIZATION MODULE
 ==============================================================================
 DESCRIPTION
-    This script implements tools for visualizing original data offered by 
+    This script implements tools for visualizing original data offered by
     competition organizing committee (Jeux Mathematiques).
-    
+
+    The cumulative sales of all days are computed up front, the annotations
+    of stores, warehouses and plants are created once and only the image and
+    day label change from frame to frame (blitting). The animation can be
+    shown interactively or exported without display as GIF or MP4 (ffmpeg):
+
+        python visualization.py
+        python visualization.py --product 'Product 2' --export sales.gif
+
 CREATED
     3/25/2018
     last modified: 4/2/2018
@@ -15,101 +23,211 @@ COLLABORATORS
     R. Borela
     S. Hanumasagar
     F. Liu
-    N. Roy 
+    N. Roy
 """
 
 # import modules
-import sys, os
+import os, shutil, subprocess, argparse
 import numpy as np
-from scipy import interpolate as intp
-import matplotlib as mpl
-import matplotlib.colors as colors
-from matplotlib import pyplot as plt
-from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 # define what product
 plot_product = 'Product 1' # 'Product 1', 'Product 2','Products 1 and 2'
 
 # set plot font properties
-font = {'size'   : 20}    
-mpl.rc('font', **font)
+font = {'size'   : 20}
 
 # paths
-input_path = 'C:/Users/Rodrigo Borela/Documents/spring18/cse6730/proj2/viz_input'
+input_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'viz_input')
 output_path = ''
 
-# load data
-stores = np.loadtxt(os.path.join(input_path,'stores.csv'),delimiter=",")
-sales_p1 = np.loadtxt(os.path.join(input_path,'sales_p1.csv'),delimiter=",")
-sales_p2 = np.loadtxt(os.path.join(input_path,'sales_p2.csv'),delimiter=",")
-warehouses = np.loadtxt(os.path.join(input_path,'warehouses.csv'),delimiter=",")
-plants = np.loadtxt(os.path.join(input_path,'plants.csv'),delimiter=",")
+# grid of the competition data
+x = np.arange(0,13,1)
+y = np.arange(0,7,1)
 
-# define warehouse store assignment
-warehouse_assgn = [[1,3,4,6,7,8,11,12,14,17,18],
-                   [2,5,9,10,13,15,16,19,20]]
+#===========
+# LOAD DATA
 
-# get number of days
-n_days = np.shape(sales_p1)[1]
+def load_data(input_path=input_path):
+    data = {}
+    for name in ('stores', 'sales_p1', 'sales_p2', 'warehouses', 'plants'):
+        data[name] = np.loadtxt(os.path.join(input_path, name+'.csv'), delimiter=",", ndmin=2)
+    return data
 
-# generate grid
-x = np.arange(0,13,1)
-y = np.arange(0,7,1)
+# daily sales of the product in each store (stores x days)
+def product_sales(data, product=plot_product):
+    if product == 'Product 1':
+        return data['sales_p1']
+    elif product == 'Product 2':
+        return data['sales_p2']
+    elif product == 'Products 1 and 2':
+        return data['sales_p1'] + data['sales_p2']
+    raise ValueError('unknown product: '+str(product))
+
+# total sales grid of every day (days x len(x) x len(y)), nan where there is no store
+def cumulative_sales(stores, sales):
+    cum_sales = np.cumsum(sales, axis=1)
+    total_sales = np.zeros((sales.shape[1], len(x), len(y)))
+    np.add.at(total_sales, (slice(None), stores[:,0].astype(int), stores[:,1].astype(int)), cum_sales.T)
+    no_store = np.ones((len(x), len(y)), dtype=bool)
+    no_store[stores[:,0].astype(int), stores[:,1].astype(int)] = False
+    total_sales[:, no_store] = np.nan
+    return total_sales
+
+#========
+# FIGURE
 
-# generate total sales grid
-total_sales = np.zeros([13, 7])
-total_sales[total_sales == 0.0] = np.nan
-total_sales[stores[:,0].astype(int),stores[:,1].astype(int)] = 0.0
-
-# generate figure objects
-fig, ax = plt.subplots()
-div = make_axes_locatable(ax)
-cax = div.append_axes('right', '3%', '3%')
-        
-# loop over year
-for day in range(n_days):
-    ax.cla()
-    s_index = 0
-    for s in stores:
-        # update sale totals in each store
-        if plot_product == 'Product 1':
-            total_sales[int(s[0]),int(s[1])] += sales_p1[s_index,day]
-        elif plot_product == 'Product 2':
-            total_sales[int(s[0]),int(s[1])] += sales_p2[s_index,day]
-        elif plot_product == 'Products 1 and 2':
-            total_sales[int(s[0]),int(s[1])] += sales_p1[s_index,day] + sales_p2[s_index,day]
-        # annotate stores
-        bbox_props = dict(boxstyle='round', fc = 'white', ec='w',
-                          alpha = .8, lw=2)
-        t = ax.text(s[0],s[1], 'S'+str(s_index+1), ha="center", va="center",
-            size=14,
-            bbox=bbox_props)
-        # update store counter
-        s_index += 1
+# draw the static parts of the figure on fig, returns the update function
+# of a day and the artists it changes (image, day label and annotations
+# drawn on top of the image)
+def build_figure(fig, data, total_sales, product=plot_product):
+    from matplotlib import rc
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+    rc('font', **font)
+    ax = fig.add_subplot()
+    div = make_axes_locatable(ax)
+    cax = div.append_axes('right', '3%', '3%')
+    annotations = []
+    # annotate stores
+    bbox_props = dict(boxstyle='round', fc = 'white', ec='w',
+                      alpha = .8, lw=2)
+    for s_index, s in enumerate(data['stores']):
+        annotations.append(ax.text(s[0],s[1], 'S'+str(s_index+1), ha="center", va="center",
+                                   size=14, bbox=bbox_props))
     # annotate warehouses
     bbox_props = dict(boxstyle='circle', fc = 'black', ec='k',
-                          alpha = .8, lw=2, pad = 1.5)
-    t = ax.text(int(warehouses[0,0]),int(warehouses[0,1]), 'W1', ha="center", va="center",
-            size=14, color = 'white',
-            bbox=bbox_props)
-    t = ax.text(int(warehouses[1,0]),int(warehouses[1,1]), 'W2', ha="center", va="center",
-            size=14, color = 'white',
-            bbox=bbox_props)
+                      alpha = .8, lw=2, pad = 1.5)
+    for w_index, w in enumerate(data['warehouses']):
+        annotations.append(ax.text(int(w[0]),int(w[1]), 'W'+str(w_index+1), ha="center", va="center",
+                                   size=14, color = 'white', bbox=bbox_props))
     # annotate plants
     bbox_props = dict(boxstyle='roundtooth', fc = 'grey', ec='k',
-                          alpha = .8, lw=2, pad = 1.5)
-    t = ax.text(int(plants[0,0]),int(plants[0,1]), 'P1', ha="center", va="center",
-            size=14, color = 'white',
-            bbox=bbox_props)
-    t = ax.text(int(plants[1,0]),int(plants[1,1]), 'P2', ha="center", va="center",
-            size=14, color = 'white',
-            bbox=bbox_props)
-    # update graph
+                      alpha = .8, lw=2, pad = 1.5)
+    for p_index, p in enumerate(data['plants']):
+        annotations.append(ax.text(int(p[0]),int(p[1]), 'P'+str(p_index+1), ha="center", va="center",
+                                   size=14, color = 'white', bbox=bbox_props))
+    # graph (color scale of the whole year)
     ax.grid()
-    im = ax.imshow(total_sales.T, origin = 'lower', interpolation = 'none', cmap='jet')
-    cb = fig.colorbar(im, cax=cax)
-    ax.set_title(plot_product+': Day {}'.format(day))
+    im = ax.imshow(total_sales[0].T, origin = 'lower', interpolation = 'none', cmap='jet',
+                   vmin=0, vmax=max(np.nanmax(total_sales[-1]), 1))
+    fig.colorbar(im, cax=cax)
+    ax.set_title(product)
     ax.set_aspect('equal')
-    ax.xaxis.set_ticks(x); ax.xaxis.set_label('x (km)');
-    ax.yaxis.set_ticks(y); ax.yaxis.set_label('y (km)');
-    plt.pause(.025)
\ No newline at end of file
+    ax.xaxis.set_ticks(x); ax.set_xlabel('x (km)')
+    ax.yaxis.set_ticks(y); ax.set_ylabel('y (km)')
+    # day label in a free row on top of the grid (blitting redraws the axes only)
+    ax.set_ylim(y[0]-.5, y[-1]+1.5)
+    label = ax.text(x[-1]/2., y[-1]+1, '', ha='center', va='center', size=14,
+                    bbox=dict(boxstyle='round', fc='white', ec='w', alpha=.8))
+    artists = [im, label] + annotations
+    for artist in artists:
+        artist.set_animated(True)
+    def update(day):
+        im.set_data(total_sales[day].T)
+        label.set_text('Day {}'.format(day))
+        return artists
+    return update, artists
+
+#===========
+# ANIMATION
+
+# interactive animation (blitting)
+def animate(data, product=plot_product, interval=25):
+    from matplotlib import pyplot as plt
+    from matplotlib.animation import FuncAnimation
+    total_sales = cumulative_sales(data['stores'], product_sales(data, product))
+    fig = plt.figure()
+    update, artists = build_figure(fig, data, total_sales, product)
+    animation = FuncAnimation(fig, update, frames=len(total_sales), interval=interval,
+                              blit=True, repeat=False)
+    plt.show()
+    return animation
+
+# export the animation without display as GIF (Pillow) or MP4 (ffmpeg):
+# the static figure and the annotations are rendered once, every frame draws
+# the image and day label and blends the annotations on top of them
+def export_animation(path, data, product=plot_product, fps=20, dpi=100):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    total_sales = cumulative_sales(data['stores'], product_sales(data, product))
+    fig = Figure(dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    update, artists = build_figure(fig, data, total_sales, product)
+    im, label, annotations = artists[0], artists[1], artists[2:]
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    # annotations alone on a transparent canvas (straight alpha)
+    renderer = canvas.get_renderer()
+    renderer.clear()
+    for artist in annotations:
+        artist.axes.draw_artist(artist)
+    overlay = np.asarray(canvas.buffer_rgba()).astype(float)
+    rows, cols = np.nonzero(overlay[:,:,3])
+    alpha = overlay[rows, cols, 3:] / 255.
+    color = overlay[rows, cols, :3] * alpha
+    width, height = canvas.get_width_height()
+    writer = frame_writer(path, width, height, fps)
+    try:
+        for day in range(len(total_sales)):
+            canvas.restore_region(background)
+            update(day)
+            im.axes.draw_artist(im)
+            label.axes.draw_artist(label)
+            frame = np.array(canvas.buffer_rgba())
+            frame[rows, cols, :3] = np.rint(color + frame[rows, cols, :3] * (1. - alpha))
+            writer.send(frame)
+    finally:
+        writer.close()
+    return path
+
+# coroutine writing RGBA frames to a GIF or video file (send frames, close at the end)
+def frame_writer(path, width, height, fps):
+    if path.lower().endswith('.gif'):
+        writer = gif_writer(path, fps)
+    else:
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError('video export requires ffmpeg (export a .gif instead)')
+        writer = video_writer(path, ffmpeg, width, height, fps)
+    next(writer)
+    return writer
+
+def gif_writer(path, fps):
+    from PIL import Image
+    frames = []
+    try:
+        while True:
+            frame = yield
+            frames.append(Image.fromarray(frame[:,:,:3]).quantize(colors=255, method=Image.Quantize.FASTOCTREE))
+    finally:
+        if frames:
+            frames[0].save(path, save_all=True, append_images=frames[1:],
+                           duration=int(1000/fps), loop=0)
+
+def video_writer(path, ffmpeg, width, height, fps):
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+               '-s', '%dx%d' % (width, height), '-r', str(fps), '-i', '-',
+               '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        while True:
+            frame = yield
+            process.stdin.write(frame.tobytes())
+    finally:
+        process.stdin.close()
+        process.wait()
+
+#=========
+# EXECUTE
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='animation of the cumulative sales of the stores')
+    parser.add_argument('--product', default=plot_product,
+                        choices=('Product 1', 'Product 2', 'Products 1 and 2'))
+    parser.add_argument('--export', help='GIF or MP4 file (no display)')
+    parser.add_argument('--fps', type=int, default=20)
+    args = parser.parse_args()
+    data = load_data(input_path)
+    if args.export:
+        export_animation(os.path.join(output_path, args.export), data, args.product, args.fps)
+    else:
+        animate(data, args.product)